@@ -9,24 +9,48 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
+from app.events import EventStream
+from app.background import BackgroundWorker
+from app.compression import Compressor
+from app.sessions import SessionBackend
+from app.replicas import ReplicaRouter, RoutingSession
+from app.metrics import Metrics
+from app.query_budget import QueryBudget
+from app.profiler import SlowRequestProfiler
+from app import ciphertext
+from app.database import configure_engine
 import os
 
 bcrypt = Bcrypt()
 login_manager = LoginManager()
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 csrf = CSRFProtect()
+event_stream = EventStream()
+background = BackgroundWorker()
+compressor = Compressor()
+session_backend = SessionBackend()
+replica_router = ReplicaRouter()
+metrics_collector = Metrics()
+query_budgets = QueryBudget()
+profiler = SlowRequestProfiler()
 
 
-def create_app():
+def create_app(config=None):
     """
     Returns an instance of the application.
 
+    :param config: optional settings overriding the configuration, such as the database of a benchmark
     :return: application
     """
 
     app = Flask(__name__)
     app.config.from_object('config.Config')
     app.config.from_pyfile('config.py', silent=True)
+    if config is not None:
+        app.config.update(config)
+
+    # Must be set before the models are used
+    ciphertext.set_storage(app.config.get('CIPHERTEXT_STORAGE', 'text'))
 
     # Import all the routes from the blueprints
     from . import home_routes
@@ -39,7 +63,20 @@ def create_app():
     login_manager.login_view = 'account.login'
 
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_engine(engine, app.config.get('SQLITE_PRAGMAS', {}))
+
+    # Registered first, so its response hook runs last and sees the final response
+    metrics_collector.init_app(app)
+    query_budgets.init_app(app)
+    replica_router.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
+    profiler.init_app(app)
+    event_stream.init_app(app)
+    background.init_app(app)
+    compressor.init_app(app)
+    session_backend.init_app(app)
 
     return app
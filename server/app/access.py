@@ -0,0 +1,26 @@
+"""
+Access checks of the operator endpoints, /metrics and /profiler. Behind a reverse proxy on the same machine every
+request comes from localhost, so the address of a request is not enough to trust it. Operators also have to
+send a token from the configuration as a bearer token.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import hmac
+from flask import request
+
+
+def is_operator_request(token, allowed_addresses):
+    """
+    Checks if the current request comes from an operator, from an allowed address and with the configured token
+    in its Authorization header. No request is allowed if the token is not configured.
+    :param token: the configured token
+    :param allowed_addresses: the addresses operator requests may come from
+    :return: true if the request is allowed, false otherwise
+    """
+    if not token or request.remote_addr not in allowed_addresses:
+        return False
+
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode('utf-8'), token.encode('utf-8'))
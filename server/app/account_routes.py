@@ -4,18 +4,41 @@ Routes related to account information and login.
 @author Ethan Andrews
 @version 2024.8.12
 """
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify, abort, Response
 from app.account_forms import RegistrationForm, LoginForm
 from app.models import User
 from app import db, login_manager
-from flask_login import login_user, logout_user, current_user
+from flask_login import login_user, logout_user, current_user, login_required, UserMixin
 import time
 from app.crypto import generate_salt, generate_aes_key, aes_key_to_string, aes_encrypt
+from app.cache import TTLCache
+from app.key_directory import key_directory
+from app.sessions import regenerate_session
+from app.compression import compressible
+from sqlalchemy import event
 import hashlib
-from config import database_key
+from config import database_key, Config
 
 bp = Blueprint('account', __name__)
 
+# Identities of recently loaded users by user id
+user_cache = TTLCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL, name='user')
+
+
+class UserIdentity(UserMixin):
+    """
+    Lightweight identity of a logged-in user, with the columns the routes read on every request. The user's
+    public and private keys are left out, since few routes need them.
+    """
+
+    def __init__(self, id, username, browser_encryption_key):
+        self.id = id
+        self.username = username
+        self.browser_encryption_key = browser_encryption_key
+
+    def __repr__(self):
+        return '<UserIdentity %r>' % self.username
+
 
 @bp.route('/', methods=['GET'])
 def home():
@@ -57,6 +80,7 @@ def login_submit():
         if _check_credentials(email_hash, request.form['hashed_password']):
             # Log the user into the website
             user = User.query.filter_by(email_hash=email_hash).first()
+            regenerate_session(session)
             login_user(user)
             session['last_login_time'] = time.time()
 
@@ -130,14 +154,60 @@ def logout():
     return redirect(url_for('home.home'))
 
 
+@bp.route('/users/<username>/public-key', methods=['GET'])
+@login_required
+@compressible
+def user_public_key(username):
+    """
+    Returns the public key of a user. The key's fingerprint is used as the ETag, and browsers may keep
+    the key for PUBLIC_KEY_MAX_AGE seconds before revalidating it.
+    :param username: the user's username
+    :return: json object containing the public key
+    """
+    public_key = key_directory.get(username)
+    if public_key is None:
+        abort(404)
+
+    if request.if_none_match.contains_weak(public_key.fingerprint):
+        response = Response(status=304)
+    else:
+        response = jsonify({"success": True, "username": public_key.username, "public_key": public_key.public_key, "fingerprint": public_key.fingerprint})
+
+    response.set_etag(public_key.fingerprint)
+    response.headers['Cache-Control'] = 'private, max-age=%d' % Config.PUBLIC_KEY_MAX_AGE
+    return response
+
+
 @login_manager.user_loader
 def load_user(user_id):
     """
-    Loads a user with a given user_id.
+    Loads the identity of a user with a given user_id. Identities are cached for USER_CACHE_TTL seconds.
     :param user_id:
     :return:
     """
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    identity = user_cache.get(user_id)
+
+    if identity is None:
+        # Only load the columns needed for the identity
+        user = db.session.query(User.id, User.username, User.browser_encryption_key).filter_by(id=user_id).first()
+        if user is None:
+            return None
+
+        identity = UserIdentity(user.id, user.username, user.browser_encryption_key)
+        user_cache.put(user_id, identity)
+
+    return identity
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_cache(mapper, connection, user):
+    """
+    Removes a changed user from the identity cache.
+    :return:
+    """
+    user_cache.pop(user.id)
 
 
 def _user_exists(username, email_hash):
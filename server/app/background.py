@@ -0,0 +1,45 @@
+"""
+Runs slow jobs in a background thread pool so they do not hold up the request that started them.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundWorker:
+    """
+    Extension object that runs jobs inside an application context on a thread pool.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Creates the thread pool from the application config.
+        :param app: the application
+        :return:
+        """
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=app.config.get('BACKGROUND_WORKERS', 1), thread_name_prefix='background')
+
+    def submit(self, job, *args, **kwargs):
+        """
+        Submits a job to be run in the background.
+        :param job: the function to run
+        :return: future of the job's result
+        """
+        return self._executor.submit(self._run, job, *args, **kwargs)
+
+    def _run(self, job, *args, **kwargs):
+        with self.app.app_context():
+            try:
+                return job(*args, **kwargs)
+            except Exception:
+                self.app.logger.exception("Background job %s failed", job.__name__)
+                raise
@@ -0,0 +1,114 @@
+"""
+In-memory caches shared by the application.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Caches created with a name by name, their statistics are exported by app.metrics
+_named_caches = {}
+
+
+class LRUCache:
+    """
+    Thread-safe cache that holds at most maxsize entries, evicting the least recently used entry.
+    """
+
+    def __init__(self, maxsize=1024, name=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if name is not None:
+            _named_caches[name] = self
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value of a key and marks it as recently used.
+        :param key: the key
+        :param default: value returned if the key is not cached
+        :return: the cached value or default
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Caches a value, evicting the least recently used entry if the cache is full.
+        :param key: the key
+        :param value: the value
+        :return:
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """
+        Removes a key from the cache.
+        :param key: the key
+        :return:
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """
+    LRU cache whose entries also expire ttl seconds after they were cached.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, name=None):
+        super().__init__(maxsize, name)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        super().put(key, (time.monotonic() + self.ttl, value))
+
+
+def named_caches():
+    """
+    Returns the caches that were created with a name.
+    :return: dictionary of the caches by name
+    """
+    return dict(_named_caches)
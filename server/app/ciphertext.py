@@ -0,0 +1,175 @@
+"""
+Compact binary storage of ciphertext columns. Ciphertext is exchanged with clients as text, either as
+"iv:ciphertext" hex or Base64 pairs or as a single Base64 string, and in binary storage mode it is stored
+as the raw bytes behind a one byte envelope version:
+
+    0x00  verbatim UTF-8 text, for values in no other format
+    0x01  lowercase hex pair: iv length byte, iv, ciphertext
+    0x02  Base64 pair: iv length byte, iv, ciphertext
+    0x03  single Base64 string
+
+Values stored as text by earlier versions always start with a printable character, so they can be
+read in either storage mode.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import base64
+import binascii
+from sqlalchemy.types import TypeDecorator, LargeBinary, String, Text
+
+_VERBATIM = 0
+_HEX_PAIR = 1
+_BASE64_PAIR = 2
+_BASE64 = 3
+
+# Either "text" or "binary", set from the CIPHERTEXT_STORAGE setting when the application is created
+_storage = {"mode": "text"}
+
+
+def set_storage(mode):
+    """
+    Sets how ciphertext columns are stored.
+    :param mode: "text" or "binary"
+    :return:
+    """
+    if mode not in ("text", "binary"):
+        raise ValueError("Unknown ciphertext storage: %s" % mode)
+    _storage["mode"] = mode
+
+
+def is_binary_storage():
+    return _storage["mode"] == "binary"
+
+
+def pack(text):
+    """
+    Converts ciphertext text into its binary envelope.
+    :param text: the ciphertext as text
+    :return: the envelope bytes
+    """
+    first, separator, second = text.partition(":")
+
+    if separator:
+        iv_and_ciphertext = _unhex_pair(first, second)
+        if iv_and_ciphertext is not None:
+            return _pack_pair(text, _HEX_PAIR, *iv_and_ciphertext)
+
+        iv_and_ciphertext = _unbase64_pair(first, second)
+        if iv_and_ciphertext is not None:
+            return _pack_pair(text, _BASE64_PAIR, *iv_and_ciphertext)
+
+    else:
+        data = _unbase64(text)
+        if data is not None:
+            return bytes((_BASE64,)) + data
+
+    return bytes((_VERBATIM,)) + text.encode('utf-8')
+
+
+def unpack(data):
+    """
+    Converts a stored ciphertext value back into text.
+    :param data: the envelope bytes, or a value stored as text
+    :return: the ciphertext as text
+    """
+    if isinstance(data, str):
+        return data
+
+    data = bytes(data)
+    if not data or data[0] >= 0x20:
+        # Stored as text before the column was converted
+        return data.decode('utf-8')
+
+    version = data[0]
+    if version == _VERBATIM:
+        return data[1:].decode('utf-8')
+    if version == _BASE64:
+        return base64.b64encode(data[1:]).decode('ascii')
+
+    iv_length = data[1]
+    iv, ciphertext = data[2:2 + iv_length], data[2 + iv_length:]
+    if version == _HEX_PAIR:
+        return iv.hex() + ":" + ciphertext.hex()
+    if version == _BASE64_PAIR:
+        return base64.b64encode(iv).decode('ascii') + ":" + base64.b64encode(ciphertext).decode('ascii')
+
+    raise ValueError("Unknown ciphertext envelope version: %d" % version)
+
+
+def is_packed(data):
+    """
+    Checks if a stored value is already a binary envelope.
+    :param data: the stored value
+    :return: true if the value is an envelope, false if it is stored as text
+    """
+    return isinstance(data, (bytes, bytearray, memoryview)) and len(data) > 0 and bytes(data[:1])[0] < 0x20
+
+
+class Ciphertext(TypeDecorator):
+    """
+    Column type for ciphertext. Always handled as text by the application, and stored as text or as a
+    binary envelope depending on the storage mode.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, length=None):
+        super().__init__(length)
+        self.length = length
+
+    def load_dialect_impl(self, dialect):
+        if is_binary_storage():
+            return dialect.type_descriptor(LargeBinary(self.length))
+        if self.length is None:
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(String(self.length))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not is_binary_storage():
+            return value
+        return pack(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        return unpack(value)
+
+
+def _pack_pair(text, version, iv, ciphertext):
+    # IVs too long for the length byte are stored as the text the client sent
+    if len(iv) > 255:
+        return bytes((_VERBATIM,)) + text.encode('utf-8')
+    return bytes((version, len(iv))) + iv + ciphertext
+
+
+def _unhex_pair(first, second):
+    # Only lowercase hex converts back to the same text
+    try:
+        iv, ciphertext = bytes.fromhex(first), bytes.fromhex(second)
+    except ValueError:
+        return None
+
+    if iv.hex() != first or ciphertext.hex() != second:
+        return None
+    return iv, ciphertext
+
+
+def _unbase64_pair(first, second):
+    iv, ciphertext = _unbase64(first), _unbase64(second)
+    if iv is None or ciphertext is None:
+        return None
+    return iv, ciphertext
+
+
+def _unbase64(text):
+    # Only canonical Base64 converts back to the same text
+    try:
+        data = base64.b64decode(text, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+    if not text or base64.b64encode(data).decode('ascii') != text:
+        return None
+    return data
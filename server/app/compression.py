@@ -0,0 +1,225 @@
+"""
+Compression of JSON responses. The encoding is negotiated with the request's Accept-Encoding header,
+preferring zstd, then brotli, then gzip. zstd and brotli are only offered when the optional zstandard
+and brotli packages are installed.
+
+Only the responses of views marked with the compressible decorator are compressed. The size of a compressed
+response reveals how much of its content repeats, so when a response holds a secret, such as a key, next to
+text another user controls, such as a post or a username, an attacker can guess the secret piece by piece from
+the sizes of responses (the BREACH attack). Views are therefore only marked when their responses carry no keys,
+and the keys of a page are sent in their own response, which is never compressed.
+
+The COMPRESS_BLUEPRINTS setting maps a blueprint name to options overriding the global COMPRESS_MIN_SIZE,
+COMPRESS_LEVEL and COMPRESS_ALGORITHMS settings, and the marked views of other blueprints are not compressed.
+Buffered responses smaller than the minimum size are sent as is. Streamed responses, such as the ones created
+with stream_json, are compressed chunk by chunk as they are sent.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import json
+import zlib
+from flask import current_app, request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Compressors by content coding, with the default level of each. The levels favour speed over size,
+# since every response is compressed on the fly
+_COMPRESSORS = {"gzip": (_GzipCompressor, 6)}
+if brotli is not None:
+    _COMPRESSORS["br"] = (_BrotliCompressor, 4)
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = (_ZstdCompressor, 3)
+
+
+def compressible(view):
+    """
+    Decorator allowing the responses of a route to be compressed. Place it below the route decorator, and only
+    use it on routes whose responses hold no keys or other secrets.
+    :param view: the view function
+    :return: the view function
+    """
+    view.compressible = True
+    return view
+
+
+class Compressor:
+    """
+    Extension object that compresses the responses of the compressible views of the configured blueprints.
+    """
+
+    def __init__(self, app=None):
+        self.blueprints = {}
+        self.mimetypes = ()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Reads the compression settings and registers the response hook.
+        :param app: the application
+        :return:
+        """
+        defaults = {
+            "min_size": app.config.get('COMPRESS_MIN_SIZE', 500),
+            "level": app.config.get('COMPRESS_LEVEL'),
+            "algorithms": app.config.get('COMPRESS_ALGORITHMS', ("zstd", "br", "gzip")),
+        }
+
+        self.blueprints = {}
+        for name, options in app.config.get('COMPRESS_BLUEPRINTS', {}).items():
+            settings = {**defaults, **options}
+            settings["algorithms"] = [algorithm for algorithm in settings["algorithms"] if algorithm in _COMPRESSORS]
+            self.blueprints[name] = settings
+
+        self.mimetypes = tuple(app.config.get('COMPRESS_MIMETYPES', ("application/json",)))
+        app.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        """
+        Compresses a response if its view is compressible, its blueprint is configured and the client accepts a
+        supported encoding.
+        :param response: the response
+        :return: the response
+        """
+        settings = self.blueprints.get(request.blueprint)
+        if settings is None or response.mimetype not in self.mimetypes:
+            return response
+        if not getattr(current_app.view_functions.get(request.endpoint), 'compressible', False):
+            return response
+        if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _negotiate(settings["algorithms"])
+        if encoding is None:
+            return response
+
+        compressor_class, default_level = _COMPRESSORS[encoding]
+        compressor = compressor_class(settings["level"] if settings["level"] is not None else default_level)
+
+        if response.is_streamed:
+            response.response = _compress_stream(compressor, response.response)
+            del response.headers['Content-Length']
+        else:
+            if response.content_length is not None and response.content_length < settings["min_size"]:
+                return response
+
+            data = response.get_data()
+            compressed = compressor.compress(data) + compressor.finish()
+
+            # Not worth sending if it did not get any smaller
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed body is a different representation of the same resource
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+
+        return response
+
+
+def stream_json(data, chunk_size=16384):
+    """
+    Creates a JSON response that is encoded while it is sent, so large responses are not held in memory
+    as a whole string and then again as compressed bytes.
+    :param data: json serializable data
+    :param chunk_size: approximate size of the chunks sent
+    :return: the response
+    """
+    provider = current_app.json
+    encoder = json.JSONEncoder(ensure_ascii=provider.ensure_ascii, sort_keys=provider.sort_keys,
+                               separators=(",", ":"), default=provider.default)
+
+    def generate():
+        buffer = []
+        size = 0
+        for piece in encoder.iterencode(data):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield "".join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+        if buffer:
+            yield "".join(buffer).encode('utf-8')
+
+    return Response(generate(), mimetype=provider.mimetype)
+
+
+def _negotiate(algorithms):
+    """
+    Picks the encoding the client prefers the most, breaking ties by the server's order.
+    :param algorithms: the supported content codings in the server's order of preference
+    :return: the content coding, or None if the response should not be compressed
+    """
+    best = None
+    best_quality = 0
+    for algorithm in algorithms:
+        quality = request.accept_encodings[algorithm]
+        if quality > best_quality:
+            best = algorithm
+            best_quality = quality
+    return best
+
+
+def _compress_stream(compressor, chunks):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+    finally:
+        # The original iterable is replaced, so it is closed here instead of by the response
+        if hasattr(chunks, 'close'):
+            chunks.close()
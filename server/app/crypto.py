@@ -9,9 +9,19 @@ import secrets
 import string
 import os
 import base64
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+import binascii
+import time
+from functools import lru_cache, wraps
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+from cryptography.hazmat.primitives.ciphers.modes import ECB
 from cryptography.hazmat.backends import default_backend
 
+# CFB has moved to the decrepit module in newer versions of cryptography
+try:
+    from cryptography.hazmat.decrepit.ciphers.modes import CFB
+except ImportError:
+    from cryptography.hazmat.primitives.ciphers.modes import CFB
+
 
 def generate_salt(length=16):
     """
@@ -48,57 +58,258 @@ def aes_key_to_string(key):
     return base64.b64encode(key).decode('utf-8')
 
 
-def aes_encrypt(message, key):
+class AESKey:
     """
-    Encrypts a message with AES. Default: uses the database key
-    :param message: the message to be encrypted
-    :param key: AES key as bytes.
-    :return: the encrypted message as a string
+    Handle for an AES key that is decoded and validated once, so it can be reused for many messages.
     """
-    # Generate initialization vector
-    iv = os.urandom(16)
+    __slots__ = ('_algorithm', '_backend')
+
+    def __init__(self, key):
+        """
+        :param key: the AES key as bytes or as a Base64-encoded string.
+        """
+        if isinstance(key, str):
+            key = base64.b64decode(key.encode('utf-8'))
+
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Invalid key size. Key must be 128, 192, or 256 bits.")
+
+        self._algorithm = algorithms.AES(key)
+        self._backend = default_backend()
+
+    def encrypt_bytes(self, data):
+        """
+        Encrypts raw bytes.
+        :param data: the bytes to be encrypted
+        :return: the initialization vector followed by the ciphertext
+        """
+        iv = os.urandom(16)
+        encryptor = Cipher(self._algorithm, CFB(iv), backend=self._backend).encryptor()
+        return iv + encryptor.update(data) + encryptor.finalize()
+
+    def decrypt_bytes(self, data):
+        """
+        Decrypts raw bytes produced by encrypt_bytes. Accepts any bytes-like object without copying it.
+        :param data: the initialization vector followed by the ciphertext
+        :return: the decrypted bytes
+        """
+        data = memoryview(data)
+        decryptor = Cipher(self._algorithm, CFB(bytes(data[:16])), backend=self._backend).decryptor()
+        return decryptor.update(data[16:]) + decryptor.finalize()
+
+    def encrypt(self, message):
+        """
+        Encrypts a message.
+        :param message: the message to be encrypted, as a string or bytes
+        :return: the encrypted message as a string
+        """
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+
+        iv = os.urandom(16)
+        encryptor = Cipher(self._algorithm, CFB(iv), backend=self._backend).encryptor()
+        ciphertext = encryptor.update(message) + encryptor.finalize()
+
+        return _encrypted_to_string(base64.b64encode(iv).decode('ascii'), base64.b64encode(ciphertext).decode('ascii'))
+
+    def decrypt(self, encrypted_message):
+        """
+        Decrypts a message.
+        :param encrypted_message: the encrypted message string
+        :return: the decrypted message
+        """
+        return self._decrypt(encrypted_message).decode('utf-8')
+
+    def encrypt_many(self, messages):
+        """
+        Encrypts many messages with this key. CFB encryption feeds every block's ciphertext into the next block,
+        so messages are encrypted one at a time.
+        :param messages: iterable of messages, as strings or bytes
+        :return: list of the encrypted message strings, in the same order
+        """
+        return [self.encrypt(message) for message in messages]
+
+    def decrypt_many(self, encrypted_messages, as_bytes=False):
+        """
+        Decrypts many messages that were encrypted with this key, in a single pass over all of them.
+        :param encrypted_messages: iterable of encrypted message strings
+        :param as_bytes: return the decrypted bytes instead of strings
+        :return: list of the decrypted messages, in the same order
+        """
+        ivs = []
+        ciphertexts = []
+        for encrypted_message in encrypted_messages:
+            iv_encoded, ciphertext_encoded = _string_to_encrypted(encrypted_message)
+            ivs.append(binascii.a2b_base64(iv_encoded))
+            ciphertexts.append(binascii.a2b_base64(ciphertext_encoded))
+
+        decrypted = self._decrypt_batch(ivs, ciphertexts)
+        if as_bytes:
+            return decrypted
+
+        return [message.decode('utf-8') for message in decrypted]
+
+    def decrypt_bytes_many(self, buffers):
+        """
+        Decrypts many raw buffers produced by encrypt_bytes, in a single pass over all of them.
+        :param buffers: iterable of bytes-like objects, each an initialization vector followed by the ciphertext
+        :return: list of the decrypted bytes, in the same order
+        """
+        buffers = [memoryview(buffer) for buffer in buffers]
+        return self._decrypt_batch([buffer[:16] for buffer in buffers], [buffer[16:] for buffer in buffers])
+
+    def _decrypt_batch(self, ivs, ciphertexts):
+        """
+        Decrypts many CFB messages at once. Messages larger than _BATCH_MAX_MESSAGE_SIZE are decrypted one at
+        a time, since copying them into the batch costs more than creating their cipher context.
+        :param ivs: the initialization vectors, as bytes-like objects
+        :param ciphertexts: the ciphertexts, as bytes-like objects
+        :return: list of the decrypted bytes, in the same order
+        """
+        decrypted = [None] * len(ciphertexts)
+        small = []
+        for i, (iv, ciphertext) in enumerate(zip(ivs, ciphertexts)):
+            if len(ciphertext) > _BATCH_MAX_MESSAGE_SIZE:
+                decryptor = Cipher(self._algorithm, CFB(bytes(iv)), backend=self._backend).decryptor()
+                decrypted[i] = decryptor.update(ciphertext) + decryptor.finalize()
+            else:
+                small.append(i)
+
+        if small:
+            for i, message in zip(small, self._decrypt_small([ivs[i] for i in small], [ciphertexts[i] for i in small])):
+                decrypted[i] = message
+
+        return decrypted
+
+    def _decrypt_small(self, ivs, ciphertexts):
+        """
+        Decrypts small CFB messages in a single pass. CFB decrypts each block by XORing the ciphertext with the
+        encryption of the previous ciphertext block, or of the initialization vector for the first block. Those
+        inputs are all known up front, so the keystream of every message is computed with one call to the block
+        cipher over a single buffer, and XORed with the ciphertexts as one large integer.
+        :param ivs: the initialization vectors, as bytes-like objects
+        :param ciphertexts: the ciphertexts, as bytes-like objects
+        :return: list of the decrypted bytes, in the same order
+        """
+        # Blocks to encrypt: each message's iv and all its ciphertext blocks except the last
+        blocks = []
+        for iv, ciphertext in zip(ivs, ciphertexts):
+            block_count = (len(ciphertext) + 15) // 16
+            if block_count:
+                blocks.append(iv)
+                blocks.append(ciphertext[:16 * (block_count - 1)])
+
+        # ECB is only used as the raw block function that produces the CFB keystream
+        keystream = Cipher(self._algorithm, ECB(), backend=self._backend).encryptor().update(b"".join(blocks))
+
+        # Trim each message's keystream to the length of its ciphertext
+        keystream_parts = []
+        offset = 0
+        for ciphertext in ciphertexts:
+            keystream_parts.append(keystream[offset:offset + len(ciphertext)])
+            offset += (len(ciphertext) + 15) // 16 * 16
+
+        joined = b"".join(ciphertexts)
+        plaintext = (int.from_bytes(b"".join(keystream_parts), 'big') ^ int.from_bytes(joined, 'big')).to_bytes(len(joined), 'big')
 
-    # Decode the key string into a key
-    key = base64.b64decode(key.encode('utf-8'))
+        decrypted = []
+        offset = 0
+        for ciphertext in ciphertexts:
+            decrypted.append(plaintext[offset:offset + len(ciphertext)])
+            offset += len(ciphertext)
+        return decrypted
 
-    # Create AES cipher object with key and IV
-    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
+    def _decrypt(self, encrypted_message):
+        iv_encoded, ciphertext_encoded = _string_to_encrypted(encrypted_message)
+        decryptor = Cipher(self._algorithm, CFB(base64.b64decode(iv_encoded)), backend=self._backend).decryptor()
+        return decryptor.update(base64.b64decode(ciphertext_encoded)) + decryptor.finalize()
 
-    # Encrypt the message
-    ciphertext = encryptor.update(message.encode('utf-8')) + encryptor.finalize()
 
-    # Encode the IV and ciphertext
-    iv_encoded = base64.b64encode(iv).decode('utf-8')
-    ciphertext_encoded = base64.b64encode(ciphertext).decode('utf-8')
+# Largest ciphertext in bytes decrypted in a single pass by AESKey.decrypt_many, larger ones are decrypted separately
+_BATCH_MAX_MESSAGE_SIZE = 1024
 
-    return _encrypted_to_string(iv_encoded, ciphertext_encoded)
+# Called with the name and duration in seconds of every aes_* call, when set with set_timer
+_timer = None
 
 
+def set_timer(timer):
+    """
+    Sets the function that records the duration of the aes_* functions, such as a metrics collector.
+    :param timer: function taking the name of the function and the seconds it took, or None to stop timing
+    :return:
+    """
+    global _timer
+    _timer = timer
+
+
+def _timed(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if _timer is None:
+            return function(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _timer(function.__name__, time.perf_counter() - start)
+
+    return wrapper
+
+
+@lru_cache(maxsize=32)
+def get_aes_key(key):
+    """
+    Returns a reusable key handle for a Base64-encoded AES key string. Handles are cached, so repeated
+    calls with the same key do not decode the key again.
+    :param key: AES key as a Base64-encoded string.
+    :return: the key handle
+    """
+    return AESKey(key)
+
+
+@_timed
+def aes_encrypt(message, key):
+    """
+    Encrypts a message with AES. Default: uses the database key
+    :param message: the message to be encrypted
+    :param key: AES key as a Base64-encoded string.
+    :return: the encrypted message as a string
+    """
+    return get_aes_key(key).encrypt(message)
+
+
+@_timed
 def aes_decrypt(encrypted_message, key):
     """
     Decrypts a message with AES. Default: uses the database key
     :param encrypted_message: the encrypted message
-    :param key: the AES key as bytes.
+    :param key: the AES key as a Base64-encoded string.
     :return: the decrypted message
     """
-    iv_encoded, ciphertext_encoded = _string_to_encrypted(encrypted_message)
-
-    # Decode the key string into a key
-    key = base64.b64decode(key.encode('utf-8'))
+    return get_aes_key(key).decrypt(encrypted_message)
 
-    # Decode the Base64-encoded IV and ciphertext
-    iv = base64.b64decode(iv_encoded)
-    ciphertext = base64.b64decode(ciphertext_encoded)
 
-    # Create AES cipher object with key and IV
-    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend())
-    decryptor = cipher.decryptor()
+@_timed
+def aes_decrypt_many(encrypted_messages, key):
+    """
+    Decrypts a list of messages that were encrypted with the same AES key.
+    :param encrypted_messages: the encrypted messages
+    :param key: the AES key as a Base64-encoded string.
+    :return: list of the decrypted messages, in the same order
+    """
+    return get_aes_key(key).decrypt_many(encrypted_messages)
 
-    # Decrypt the ciphertext
-    plaintext = decryptor.update(ciphertext) + decryptor.finalize()
 
-    return plaintext.decode('utf-8')
+@_timed
+def aes_encrypt_many(messages, key):
+    """
+    Encrypts a list of messages with the same AES key.
+    :param messages: the messages to be encrypted
+    :param key: the AES key as a Base64-encoded string.
+    :return: list of the encrypted messages, in the same order
+    """
+    return get_aes_key(key).encrypt_many(messages)
 
 
 def _encrypted_to_string(iv, ciphertext):
@@ -117,5 +328,5 @@ def _string_to_encrypted(encrypted_string):
     :param encrypted_string:
     :return:
     """
-    iv, ciphertext = encrypted_string.split(":")
+    iv, _, ciphertext = encrypted_string.partition(":")
     return iv, ciphertext
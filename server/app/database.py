@@ -0,0 +1,38 @@
+"""
+Setup of the database engines. SQLite databases are tuned with pragmas when each connection is opened,
+so a single machine deployment can use an embedded database file instead of a database server.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+from sqlalchemy import event
+
+
+def configure_engine(engine, sqlite_pragmas):
+    """
+    Registers the connection setup of an engine.
+    :param engine: the engine
+    :param sqlite_pragmas: dictionary of pragmas set on every connection to a SQLite database
+    :return:
+    """
+    if engine.dialect.name != 'sqlite' or not sqlite_pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in sqlite_pragmas.items():
+                cursor.execute("PRAGMA %s=%s" % (name, value))
+        finally:
+            cursor.close()
+
+
+def is_sqlite_uri(uri):
+    """
+    Checks if a database URI points to a SQLite database.
+    :param uri: the database URI
+    :return: true if the database is SQLite, false otherwise
+    """
+    return uri.split(':', 1)[0].split('+', 1)[0] == 'sqlite'
@@ -0,0 +1,250 @@
+"""
+Publish/subscribe of live page events. Events are published per page and streamed to
+subscribed clients. The broker backend is chosen with the EVENTS_BROKER setting:
+"local" only shares events inside a single process, "sqlite" shares events between
+all the worker processes on a machine through a SQLite file.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EventStream:
+    """
+    Extension object that publishes and subscribes page events through the configured broker.
+    """
+
+    def __init__(self, app=None):
+        self.broker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Creates the broker from the application config.
+        :param app: the application
+        :return:
+        """
+        broker_name = app.config.get('EVENTS_BROKER', 'local')
+
+        if broker_name == 'local':
+            self.broker = LocalBroker(app.config.get('EVENTS_QUEUE_SIZE', 100))
+        elif broker_name == 'sqlite':
+            self.broker = SQLiteBroker(app.config['EVENTS_SQLITE_PATH'], app.config.get('EVENTS_POLL_INTERVAL', 0.5),
+                                       app.config.get('EVENTS_RETENTION', 300))
+        else:
+            raise ValueError("Unknown events broker: %s" % broker_name)
+
+    def publish(self, page_id, event):
+        """
+        Publishes an event to every subscriber of a page.
+        :param page_id: the id of the page
+        :param event: json serializable event
+        :return:
+        """
+        self.broker.publish(page_id, event)
+
+    def subscribe(self, page_id):
+        """
+        Subscribes to the events of a page.
+        :param page_id: the id of the page
+        :return: a subscription, which must be closed when no longer needed
+        """
+        return self.broker.subscribe(page_id)
+
+    def stream(self, page_id, keepalive, timeout):
+        """
+        Generates the server-sent events of a page. The page is only subscribed to once the stream is iterated,
+        so responses whose body is never sent, such as the responses of HEAD requests, leave no subscription behind.
+        :param page_id: the id of the page
+        :param keepalive: seconds without events after which a keepalive comment is sent
+        :param timeout: seconds after which the stream ends, so the client reconnects
+        :return: generator of the event stream's text
+        """
+        subscription = self.subscribe(page_id)
+        try:
+            yield "retry: 3000\n\n"
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=min(keepalive, max(deadline - time.monotonic(), 0)))
+
+                # Send a comment to keep the connection open
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if "version" in event:
+                    yield "id: %d\n" % event["version"]
+                yield "event: %s\ndata: %s\n\n" % (event["type"], json.dumps(event))
+        finally:
+            subscription.close()
+
+
+class LocalBroker:
+    """
+    Broker that delivers events to the subscribers of the current process.
+    """
+
+    def __init__(self, queue_size=100):
+        self._queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, page_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(page_id, ()))
+
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, page_id):
+        subscription = LocalSubscription(self, page_id, self._queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(page_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.page_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.page_id]
+
+
+class LocalSubscription:
+    """
+    Subscription of the local broker. Slow subscribers that fill up their queue are told to resync.
+    """
+
+    def __init__(self, broker, page_id, queue_size):
+        self.page_id = page_id
+        self._broker = broker
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._overflowed = False
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._overflowed = True
+
+    def get(self, timeout):
+        """
+        Waits for the next event.
+        :param timeout: maximum seconds to wait
+        :return: the event, or None if no event arrived in time
+        """
+        if self._overflowed:
+            self._overflowed = False
+            self._drain()
+            return {"type": "resync"}
+
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self)
+
+    def _drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class SQLiteBroker:
+    """
+    Broker that shares events between processes through a SQLite file. Subscribers poll for new rows,
+    and rows older than the retention period are swept when publishing.
+    """
+
+    def __init__(self, path, poll_interval=0.5, retention=300):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._last_sweep = 0
+
+        connection = self.connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS page_event (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "page_id INTEGER NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_page_event_page_id_id ON page_event (page_id, id)")
+            connection.commit()
+        finally:
+            connection.close()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def publish(self, page_id, event):
+        now = time.time()
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute("INSERT INTO page_event (page_id, data, created_at) VALUES (?, ?, ?)", (page_id, json.dumps(event), now))
+
+                # Sweep old events
+                if now - self._last_sweep > self.retention:
+                    self._last_sweep = now
+                    connection.execute("DELETE FROM page_event WHERE created_at < ?", (now - self.retention,))
+        except sqlite3.Error:
+            logger.exception("Could not publish event for page %s", page_id)
+        finally:
+            connection.close()
+
+    def subscribe(self, page_id):
+        return SQLiteSubscription(self, page_id)
+
+
+class SQLiteSubscription:
+    """
+    Subscription of the SQLite broker. Only receives events published after subscribing.
+    """
+
+    def __init__(self, broker, page_id):
+        self.page_id = page_id
+        self._broker = broker
+        self._connection = broker.connect()
+        self._pending = []
+        self._last_id = self._connection.execute("SELECT COALESCE(MAX(id), 0) FROM page_event").fetchone()[0]
+
+    def get(self, timeout):
+        """
+        Waits for the next event.
+        :param timeout: maximum seconds to wait
+        :return: the event, or None if no event arrived in time
+        """
+        deadline = time.monotonic() + timeout
+
+        while not self._pending:
+            rows = self._connection.execute("SELECT id, data FROM page_event WHERE page_id = ? AND id > ? ORDER BY id LIMIT 100",
+                                            (self.page_id, self._last_id)).fetchall()
+            if rows:
+                self._last_id = rows[-1][0]
+                self._pending = [json.loads(data) for _, data in rows]
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self._broker.poll_interval, remaining))
+
+        return self._pending.pop(0)
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,90 @@
+"""
+Directory of the users' public keys. Public keys practically never change, so they are kept in a bounded
+in-memory cache by username, and the keys of a list of users are resolved with at most one query.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import hashlib
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from app import db
+from app.cache import LRUCache
+from app.models import User
+from config import Config
+
+# Public key of a user, with the SHA-256 fingerprint of the key
+PublicKey = namedtuple('PublicKey', ['id', 'username', 'public_key', 'fingerprint'])
+
+
+class PublicKeyDirectory:
+    """
+    Resolves usernames to public keys through a least recently used cache.
+    """
+
+    def __init__(self, maxsize):
+        self._cache = LRUCache(maxsize, name='public_key')
+
+    def get(self, username):
+        """
+        Returns the public key of a user.
+        :param username: the user's username
+        :return: the public key, or None if the user does not exist
+        """
+        return self.resolve([username]).get(username)
+
+    def resolve(self, usernames):
+        """
+        Returns the public keys of a list of users, querying the users that are not cached in a single query.
+        :param usernames: the users' usernames
+        :return: dictionary of the public keys of the existing users by username, in the order of the list
+        """
+        found = {}
+        missing = []
+        for username in dict.fromkeys(usernames):
+            public_key = self._cache.get(username)
+            if public_key is None:
+                missing.append(username)
+            found[username] = public_key
+
+        if missing:
+            users = db.session.query(User.id, User.username, User.public_key).filter(User.username.in_(missing)).all()
+            for user in users:
+                public_key = PublicKey(user.id, user.username, user.public_key, fingerprint(user.public_key))
+                self._cache.put(user.username, public_key)
+                found[user.username] = public_key
+
+        return {username: public_key for username, public_key in found.items() if public_key is not None}
+
+    def forget(self, username):
+        """
+        Removes a user from the cache.
+        :param username: the user's username
+        :return:
+        """
+        self._cache.pop(username)
+
+
+def fingerprint(public_key):
+    """
+    Returns the fingerprint of a public key.
+    :param public_key: the PEM encoded key
+    :return: hex SHA-256 digest of the key
+    """
+    return hashlib.sha256(public_key.encode('utf-8')).hexdigest()
+
+
+key_directory = PublicKeyDirectory(Config.PUBLIC_KEY_CACHE_SIZE)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_public_key(mapper, connection, user):
+    """
+    Removes a changed user from the directory, under both the old and the new username.
+    :return:
+    """
+    key_directory.forget(user.username)
+    for username in inspect(user).attrs.username.history.deleted:
+        key_directory.forget(username)
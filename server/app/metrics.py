@@ -0,0 +1,284 @@
+"""
+Instrumentation of the application, exposed in the Prometheus text format on /metrics. Records the latency,
+status and payload size of every request by endpoint, the time spent producing streamed bodies such as the JSON
+encoding and compression of stream_json responses, the number and duration of the SQL statements each
+endpoint runs, the time spent in the aes_* functions of app.crypto, how long requests wait to check out
+a database connection from the pool, and the hits, misses and size of the named caches of app.cache.
+
+Every worker process keeps its own metrics, so with multiple workers each scrape only sees the worker that
+answered it. /metrics only answers requests that carry METRICS_TOKEN as a bearer token and come from the
+addresses in METRICS_ALLOWED_ADDRESSES.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import threading
+import time
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from app import crypto
+from app.cache import named_caches
+from app.access import is_operator_request
+
+# Upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds of the payload size histograms, in bytes
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Upper bounds of the statements per request histograms
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Counter:
+    """
+    Counter metric with labels.
+    """
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s counter" % self.name]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append("%s%s %s" % (self.name, _format_labels(self.label_names, labels), _format_value(value)))
+        return lines
+
+
+class Histogram:
+    """
+    Histogram metric with labels and fixed buckets.
+    """
+
+    def __init__(self, name, description, buckets, label_names=()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # Counts of each bucket, followed by the sum and the total count
+                counts = self._values[labels] = [0] * len(self.buckets) + [0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            for labels, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append("%s_bucket%s %d" % (self.name, _format_labels(self.label_names + ('le',), labels + (_format_value(bound),)), cumulative))
+                lines.append("%s_bucket%s %d" % (self.name, _format_labels(self.label_names + ('le',), labels + ('+Inf',)), counts[-1]))
+                lines.append("%s_sum%s %s" % (self.name, _format_labels(self.label_names, labels), _format_value(counts[-2])))
+                lines.append("%s_count%s %d" % (self.name, _format_labels(self.label_names, labels), counts[-1]))
+        return lines
+
+
+class Metrics:
+    """
+    Extension object that instruments the application and serves the /metrics endpoint.
+    """
+
+    def __init__(self, app=None):
+        self.request_duration = Histogram('http_request_duration_seconds', "Time to handle a request, until its body is sent.", LATENCY_BUCKETS, ('endpoint', 'method'))
+        self.stream_duration = Histogram('http_response_stream_seconds', "Time spent producing streamed response bodies, without the time sending them.", LATENCY_BUCKETS, ('endpoint',))
+        self.requests = Counter('http_requests_total', "Requests handled.", ('endpoint', 'method', 'status'))
+        self.response_size = Histogram('http_response_size_bytes', "Size of the response bodies as sent.", SIZE_BUCKETS, ('endpoint',))
+        self.sql_statements = Counter('db_statements_total', "SQL statements run.", ('endpoint',))
+        self.sql_duration = Counter('db_statement_duration_seconds_total', "Time spent running SQL statements.", ('endpoint',))
+        self.sql_per_request = Histogram('db_statements_per_request', "SQL statements run by each request.", COUNT_BUCKETS, ('endpoint',))
+        self.crypto_duration = Histogram('crypto_duration_seconds', "Time spent in the aes_* functions.", LATENCY_BUCKETS, ('function',))
+        self.pool_wait = Histogram('db_pool_checkout_wait_seconds', "Time waited to check out a database connection.", LATENCY_BUCKETS, ('bind',))
+        self.token = None
+        self.allowed_addresses = ()
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Registers the request hooks, the database and crypto instrumentation and the /metrics endpoint.
+        Must be called after the database extension is initialized.
+        :param app: the application
+        :return:
+        """
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+
+        self.token = app.config.get('METRICS_TOKEN')
+        self.allowed_addresses = tuple(app.config.get('METRICS_ALLOWED_ADDRESSES', ('127.0.0.1', '::1')))
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            for bind, engine in db.engines.items():
+                self._instrument_engine(engine, bind or 'default')
+
+        crypto.set_timer(lambda name, seconds: self.crypto_duration.observe(seconds, (name,)))
+
+    def render(self):
+        """
+        Returns all the metrics in the Prometheus text format.
+        :return: the metrics text
+        """
+        lines = []
+        for metric in (self.request_duration, self.stream_duration, self.requests, self.response_size, self.sql_statements,
+                       self.sql_duration, self.sql_per_request, self.crypto_duration, self.pool_wait):
+            lines.extend(metric.render())
+        lines.extend(_render_caches())
+        return "\n".join(lines) + "\n"
+
+    def _metrics_view(self):
+        if not is_operator_request(self.token, self.allowed_addresses):
+            abort(404)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_statements = 0
+
+    def _finish_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or 'unknown'
+        self.requests.inc((endpoint, request.method, str(response.status_code)))
+        self.sql_per_request.observe(g.pop('metrics_statements', 0), (endpoint,))
+
+        if response.is_streamed:
+            # Streamed bodies are encoded while they are sent, so the request is timed once the stream ends
+            response.response = self._count_stream(response.response, endpoint, request.method, start)
+        else:
+            self.request_duration.observe(time.perf_counter() - start, (endpoint, request.method))
+            self.response_size.observe(response.content_length or 0, (endpoint,))
+
+        return response
+
+    def _count_stream(self, chunks, endpoint, method, start):
+        """
+        Passes a streamed response through, then observes its size, the time spent producing its chunks and the
+        duration of the whole request.
+        :param chunks: the response's iterable
+        :param endpoint: the endpoint of the request
+        :param method: the method of the request
+        :param start: the time the request started
+        :return: generator of the chunks
+        """
+        size = 0
+        producing = 0
+        iterator = iter(chunks)
+        try:
+            while True:
+                # Only the time to produce each chunk is counted, not the time the server takes to send it
+                chunk_start = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    producing += time.perf_counter() - chunk_start
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.response_size.observe(size, (endpoint,))
+            self.stream_duration.observe(producing, (endpoint,))
+            self.request_duration.observe(time.perf_counter() - start, (endpoint, method))
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _instrument_engine(self, engine, bind):
+        """
+        Records the statements of an engine and the time waited for its pool's connections.
+        :param engine: the engine
+        :param bind: name of the engine's bind
+        :return:
+        """
+        local = self._local
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            local.statement_start = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            seconds = time.perf_counter() - getattr(local, 'statement_start', time.perf_counter())
+            endpoint = 'none'
+            if has_request_context():
+                endpoint = request.endpoint or 'unknown'
+                g.metrics_statements = g.get('metrics_statements', 0) + 1
+            self.sql_statements.inc((endpoint,))
+            self.sql_duration.inc((endpoint,), seconds)
+
+        # The pool is replaced when the engine is disposed, so the new pool is instrumented again
+        @event.listens_for(engine, 'engine_disposed')
+        def engine_disposed(disposed_engine):
+            self._instrument_pool(disposed_engine.pool, bind)
+
+        self._instrument_pool(engine.pool, bind)
+
+    def _instrument_pool(self, pool, bind):
+        connect = pool.connect
+
+        def timed_connect():
+            start = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                self.pool_wait.observe(time.perf_counter() - start, (bind,))
+
+        pool.connect = timed_connect
+
+
+def _render_caches():
+    # Cache statistics are read when scraped, so the caches do not depend on the metrics
+    caches = sorted(named_caches().items())
+    lines = []
+    for name, description, kind, read in (
+            ('cache_hits_total', "Cache lookups that found a value.", 'counter', lambda cache: cache.hits),
+            ('cache_misses_total', "Cache lookups that found no value.", 'counter', lambda cache: cache.misses),
+            ('cache_entries', "Entries held by the cache.", 'gauge', len)):
+        lines += ["# HELP %s %s" % (name, description), "# TYPE %s %s" % (name, kind)]
+        lines += ["%s%s %d" % (name, _format_labels(('cache',), (cache_name,)), read(cache)) for cache_name, cache in caches]
+    return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join('%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -6,6 +6,7 @@ Models for the application.
 """
 
 from app import db
+from app.ciphertext import Ciphertext
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
@@ -14,15 +15,18 @@ class User(UserMixin, db.Model):
     """
     Model for the User SQL table.
     """
+    # Without AUTOINCREMENT, SQLite reuses the ids of the newest deleted rows
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     encrypted_email = db.Column(db.String(256), unique=True, nullable=False)
-    email_hash = db.Column(db.String(256), nullable=False)
+    email_hash = db.Column(db.String(256), nullable=False, index=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     public_key = db.Column(db.Text, nullable=False)
     encrypted_private_key = db.Column(db.Text, nullable=False)
     aes_salt = db.Column(db.String(16), nullable=False)
     browser_encryption_key = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
     posts = db.relationship('Post', backref='user', lazy=True)
     invites = db.relationship('Invite', backref='user', lazy=True)
     user_access = db.relationship('UserAccess', back_populates='user', lazy=True, overlaps="pages,users")
@@ -42,20 +46,44 @@ class Post(db.Model):
     """
     Model for the user post sql table.
     """
+    __table_args__ = (
+        db.Index('ix_post_page_id_id', 'page_id', 'id'),
+        db.Index('ix_post_page_id_version', 'page_id', 'version'),
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    encrypted_message = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.String(2048), nullable=False)
+    encrypted_message = db.Column(Ciphertext(), nullable=False)
+    created_at = db.Column(Ciphertext(2048), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     page_id = db.Column(db.Integer, db.ForeignKey('page.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DeletedPost(db.Model):
+    """
+    Model for the tombstones of deleted posts, so clients can sync deletions incrementally.
+    """
+    __tablename__ = 'deleted_post'
+    __table_args__ = (
+        db.Index('ix_deleted_post_page_id_version', 'page_id', 'version'),
+        {'sqlite_autoincrement': True},
+    )
+    # Post ids can be reused by the database after a post is deleted, so tombstones have their own ids
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_id = db.Column(db.Integer, nullable=False)
+    page_id = db.Column(db.Integer, db.ForeignKey('page.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
 
 
 class Page(db.Model):
     """
     Model for the page sql table.
     """
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    encrypted_title = db.Column(db.String(128), nullable=False)
-    encrypted_description = db.Column(db.String(8192), nullable=False)
+    encrypted_title = db.Column(Ciphertext(128), nullable=False)
+    encrypted_description = db.Column(Ciphertext(8192), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
     posts = db.relationship('Post', backref='page', lazy=True)
     invites = db.relationship('Invite', backref='page', lazy=True)
     user_access = db.relationship('UserAccess', back_populates='page', lazy=True, overlaps="users")
@@ -67,9 +95,12 @@ class UserAccess(db.Model):
     Model that signifies which user has access to which page which includes the user's encrypted key to access the page.
     """
     __tablename__ = 'user_access'
+    __table_args__ = (
+        db.Index('ix_user_access_user_id', 'user_id'),
+    )
     page_id = db.Column(db.Integer, db.ForeignKey('page.id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
-    encrypted_key = db.Column(db.Text)
+    encrypted_key = db.Column(Ciphertext())
     user = db.relationship('User', back_populates='user_access', overlaps="pages, users")
     page = db.relationship('Page', back_populates='user_access', overlaps="users, pages")
 
@@ -78,7 +109,12 @@ class Invite(db.Model):
     """
     Model for storing page invitations
     """
+    __table_args__ = (
+        db.Index('ix_invite_user_id_page_id', 'user_id', 'page_id', unique=True),
+        db.Index('ix_invite_page_id', 'page_id'),
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     page_id = db.Column(db.Integer, db.ForeignKey('page.id'), nullable=False)
-    encrypted_key = db.Column(db.Text, nullable=False)
+    encrypted_key = db.Column(Ciphertext(), nullable=False)
@@ -7,6 +7,7 @@ Forms for the pages part of the application.
 from flask_wtf import FlaskForm
 from wtforms import StringField, FieldList, FormField
 from wtforms.validators import DataRequired, Length
+from config import Config
 
 
 class UserForm(FlaskForm):
@@ -39,6 +40,21 @@ class KeyForm(FlaskForm):
     key = StringField('Key', validators=[DataRequired()])
 
 
+class BatchUserForm(FlaskForm):
+    """
+    Form for submitting multiple users' usernames. Usernames past INVITE_BATCH_SIZE are not read.
+    """
+    new_users = FieldList(StringField('New Username', validators=[DataRequired(), Length(min=2, max=20)]), min_entries=1,
+                          max_entries=Config.INVITE_BATCH_SIZE)
+
+
+class BatchInviteUserForm(FlaskForm):
+    """
+    Form for inviting multiple users to a page. Invitations past INVITE_BATCH_SIZE are not read.
+    """
+    encrypted_keys = FieldList(FormField(KeyForm), min_entries=1, max_entries=Config.INVITE_BATCH_SIZE)
+
+
 class PageCreateForm(FlaskForm):
     """
     Form for creating a page.
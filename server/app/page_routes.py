@@ -4,20 +4,33 @@ Routes for the page behavior.
 @author Ethan Andrews
 @version 2024.8.12
 """
-from flask import Blueprint, render_template, redirect, url_for, jsonify, session, abort, flash
+from flask import Blueprint, render_template, redirect, url_for, jsonify, session, abort, flash, request, current_app, Response
 from flask_login import login_required, current_user
 from app.account_routes import check_time_since_login as main_check_time_since_login
 from app.page_forms import RemoveUserForm, PageCreateForm, PostCreateForm, AcceptInviteForm, UserForm, InviteUserForm, \
-    DeletePageForm, DeletePostForm
-from app.models import User, Page, UserAccess, Invite, Post
-from app import db
+    BatchUserForm, BatchInviteUserForm, DeletePageForm, DeletePostForm
+from app.models import User, Page, UserAccess, Invite, Post, DeletedPost
+from app import db, event_stream, background
+from app.compression import compressible, stream_json
+from app.query_budget import max_queries
+from app.key_directory import key_directory
+from app.request_context import get_current_user, get_user_access, forget_user_access
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from datetime import datetime
-from app.crypto import aes_encrypt, aes_decrypt
-from config import database_key
+import hashlib
+from app.crypto import aes_encrypt, aes_decrypt_many
+from app.cache import LRUCache
+from config import database_key, Config
 
 bp = Blueprint('page', __name__)
 
+# Decrypted post creation times by post id and encrypted creation time. Posts are immutable, and the encrypted time
+# has a random IV, so a post that reuses a deleted post's id never gets the deleted post's cached time, because the
+# key includes the ciphertext
+timestamp_cache = LRUCache(Config.TIMESTAMP_CACHE_SIZE, name='post_timestamp')
+
 
 @bp.route('/create-page', methods=['GET'])
 @login_required
@@ -60,7 +73,7 @@ def add_user():
 
             # Get the users and public keys
             users_and_keys = _get_users_public_keys(session['invite_users'])
-            user = User.query.filter_by(id=current_user.id).first()
+            user = get_current_user()
 
             return jsonify({"success": True, "current_username": user.username, "message": "Successfully Added User", "users": users_and_keys})
 
@@ -77,26 +90,12 @@ def _validate_invite(invite_username, page=None):
     :param page: page user is to be invited to
     :return: True if user can be invited, false otherwise
     """
-    invited_user = User.query.filter_by(username=invite_username).first()
-
-    # Check if user exists
-    if invited_user is None:
-        return False
-
-    # Check if invited username is equal to the current user
-    if invite_username == User.query.filter_by(id=current_user.id).first().username:
-        return False
-
+    # Check if the user exists, is not already in the page and has not already been invited to it
     if page is not None:
-        # Check if user already is in the page
-        if invited_user in page.users:
-            return False
-
-        # Check if user has already been invited to the page
-        if Invite.query.filter_by(user_id=invited_user.id, page_id=page.id).first() is not None:
-            return False
+        return invite_username in _get_invitable_users([invite_username], page.id)
 
-    return True
+    # Check if user exists and is not the current user
+    return invite_username != get_current_user().username and key_directory.get(invite_username) is not None
 
 
 @bp.route('/create-page/remove-user', methods=['POST'])
@@ -116,7 +115,7 @@ def remove_user():
 
             # Get the users and keys
             users_and_keys = _get_users_public_keys(session['invite_users'])
-            user = User.query.filter_by(id=current_user.id).first()
+            user = get_current_user()
 
             return jsonify({"success": True, "current_username": user.username, "message": "Successfully Removed User", "users": users_and_keys})
 
@@ -132,7 +131,7 @@ def create_page_get_keys():
     :return: JSON object
     """
     # Get the current user
-    user = User.query.filter_by(id=current_user.id).first()
+    user = get_current_user()
 
     # Retrieve the invite keys
     return jsonify({"success": True, "current_username": user.username, "browser_key": user.browser_encryption_key})
@@ -152,12 +151,15 @@ def create_page_submit():
         # Create the new page
         new_page = Page(encrypted_title=page_create_form.encrypted_title.data, encrypted_description=page_create_form.encrypted_description.data)
         db.session.add(new_page)
-        db.session.commit()
+        db.session.flush()
 
-        # Add current user to the page
+        # Add current user to the page, in the same transaction so the page is never without users
         user_access = UserAccess(page_id=new_page.id, user_id=current_user.id, encrypted_key=page_create_form.creator_encrypted_key.data)
         db.session.add(user_access)
 
+        # Users whose dashboard or invites change
+        changed_user_ids = [current_user.id]
+
         requested_invited_users = {}
         for user in page_create_form.encrypted_keys.data:
             requested_invited_users[user['username']] = user['key']
@@ -165,18 +167,27 @@ def create_page_submit():
         # Invite users to the page if they exist in the session
         if session['invite_users']:
             # Get all the invited users
-            invited_users_db = User.query.filter(User.username.in_(session['invite_users'])).all()
+            invited_users_db = key_directory.resolve(session['invite_users']).values()
 
             # Check if the user submitted data for the invited user and add invites
             for invited_user in invited_users_db:
                 if invited_user.username in requested_invited_users:
                     invite = Invite(page_id=new_page.id, user_id=invited_user.id, encrypted_key=requested_invited_users[invited_user.username])
                     db.session.add(invite)
+                    changed_user_ids.append(invited_user.id)
 
-        # Clear invited users from the session and commit
-        session['invite_users'] = []
-        db.session.commit()
-        return redirect(url_for('page.pages'))
+        _bump_user_versions(changed_user_ids)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # An invited user was deleted in the meantime
+            db.session.rollback()
+            flash("Could not create page", "error")
+        else:
+            # Clear invited users from the session
+            session['invite_users'] = []
+            return redirect(url_for('page.pages'))
 
     else:
         # Flash an error
@@ -200,7 +211,7 @@ def create_page_init_get():
 
     # Retrieve the invited users' public keys
     users_and_keys = _get_users_public_keys(invite_users)
-    user = User.query.filter_by(id=current_user.id).first()
+    user = get_current_user()
 
     return jsonify({"users": users_and_keys, "current_username": user.username})
 
@@ -215,10 +226,9 @@ def _get_users_public_keys(users):
     if not users:
         return []
 
-    # Query the User model for users with usernames in the provided list and retrieve the keys in the same order
-    users = User.query.filter(User.username.in_(users)).all()
+    # Resolve the keys through the public key directory, in the same order
     users_and_keys = []
-    for user in users:
+    for user in key_directory.resolve(users).values():
         users_and_keys.append({"username": user.username, "key": user.public_key})
 
     return users_and_keys
@@ -226,32 +236,46 @@ def _get_users_public_keys(users):
 
 @bp.route('/pages/init-get', methods=['GET'])
 @login_required
+@max_queries(3)
 def pages_init_get():
     """
     Returns the objects necessary for page loading the pages html file.
     :return:
     """
-    # Extract page information
-    user = User.query.filter_by(id=current_user.id).first()
-    user_pages = _get_users_pages(user)
+    # Answer without querying the pages if the client's copy is up to date
+    etag = _make_etag("pages", current_user.id, _get_user_version())
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    # Extract a single page of page information
+    user = get_current_user()
+    after = request.args.get('after', type=int)
+    user_pages, has_more = _get_users_pages(user.id, after=after, limit=_get_limit_arg('PAGES_PAGE_SIZE'))
 
-    return jsonify({"success": True, "current_username": user.username, "pages": user_pages, "browser_key": user.browser_encryption_key})
+    return _with_etag(jsonify({"success": True, "current_username": user.username, "pages": user_pages, "has_more": has_more, "browser_key": user.browser_encryption_key}), etag)
 
 
-def _get_users_pages(user):
+def _get_users_pages(user_id, after=None, limit=None):
     """
-    Returns the page information for all the pages a user has access to.
-    :param user: the user
-    :return: the page information
+    Returns the page information for the pages a user has access to, ordered by page id.
+    :param user_id: the id of the user
+    :param after: only return pages with an id higher than this id
+    :param limit: the maximum amount of pages to return (default PAGES_PAGE_SIZE)
+    :return: the page information, and whether there are more pages after these
     """
-    user_access_relationships = user.user_access
-    user_pages = []
+    if limit is None:
+        limit = current_app.config['PAGES_PAGE_SIZE']
 
-    for user_page in user_access_relationships:
-        page = user_page.page
-        user_pages.append({"id": page.id, "title": page.encrypted_title, "key": user_page.encrypted_key})
+    # Load only the needed columns of the pages and the user's keys in a single query
+    query = db.session.query(Page.id, Page.encrypted_title, UserAccess.encrypted_key).join(UserAccess, UserAccess.page_id == Page.id).filter(UserAccess.user_id == user_id)
+    if after is not None:
+        query = query.filter(Page.id > after)
 
-    return user_pages
+    # Fetch one extra row to find out if there are more pages
+    rows = query.order_by(Page.id.asc()).limit(limit + 1).all()
+    user_pages = [{"id": page_id, "title": encrypted_title, "key": encrypted_key} for page_id, encrypted_title, encrypted_key in rows[:limit]]
+
+    return user_pages, len(rows) > limit
 
 
 @bp.route('/pages', methods=['GET'])
@@ -275,49 +299,108 @@ def delete_page_request(page_id):
     form = DeletePageForm()
 
     # Check if user has access to this request
-    page = Page.query.filter_by(id=page_id).first()
-    if not _user_has_access(page):
+    if not _user_has_access(page_id):
         abort(403)
 
     if form.validate_on_submit():
         # Delete the user's access to a page
-        user_access = next((user_access for user_access in page.user_access if user_access.user_id == current_user.id), None)
-        db.session.delete(user_access)
+        _lock_page(page_id)
+        db.session.delete(get_user_access(page_id))
+        _bump_page_version(page_id)
+        _bump_user_versions([current_user.id])
+        db.session.flush()
+
+        # If there are no user's in a page, delete its invites in the same transaction, so none can be accepted after
+        # the last user left, and then the page
+        is_empty = db.session.query(UserAccess.user_id).filter_by(page_id=page_id).limit(1).with_for_update().first() is None
+        if is_empty:
+            _delete_page_invites(page_id)
         db.session.commit()
+        forget_user_access(page_id)
 
-        # If there are no user's in a page, delete the page
-        if len(page.users) == 0:
-            _delete_page(page)
+        if is_empty:
+            _delete_page(page_id)
 
-        # Extract user's page information
-        user = User.query.filter_by(id=current_user.id).first()
-        user_pages = _get_users_pages(user)
-
-        return jsonify({"success": True, "current_username": user.username, "pages": user_pages, "browser_key": user.browser_encryption_key})
+        # Only send back the removed page id
+        return jsonify({"success": True, "current_username": current_user.username, "deleted_page": page_id})
 
     return jsonify({"success": False})
 
 
-def _delete_page(page):
+def _delete_page(page_id):
     """
-    Deletes a page and all of its dependencies.
-    :param page: the id of the page to delete
+    Deletes a page whose users and invites were deleted, and all of its posts. Pages with many posts are
+    deleted by the background worker.
+    :param page_id: the id of the page to delete
     :return:
     """
-    # Delete all the posts
-    posts = page.posts
-    for post in posts:
-        db.session.delete(post)
+    # Check if the page has more posts than the threshold without counting all of them
+    threshold = current_app.config['PAGE_DELETE_BACKGROUND_THRESHOLD']
+    is_large = db.session.query(Post.id).filter_by(page_id=page_id).order_by(Post.id).offset(threshold).limit(1).first() is not None
 
-    # Delete the invites
-    invites = page.invites
-    for invite in invites:
-        db.session.delete(invite)
+    if is_large:
+        background.submit(_delete_page_contents, page_id, current_app.config['PAGE_DELETE_BATCH_SIZE'])
+    else:
+        _delete_page_contents(page_id, current_app.config['PAGE_DELETE_BATCH_SIZE'])
+
+
+def delete_orphan_pages():
+    """
+    Deletes the pages no user has access to. Finishes the deletes that were interrupted, such as the background
+    deletes of a server that restarted before they were done. Run by migrate.py.
+    :return: the number of deleted pages
+    """
+    has_users = db.session.query(UserAccess.page_id).filter(UserAccess.page_id == Page.id).exists()
+    page_ids = [page_id for page_id, in db.session.query(Page.id).filter(~has_users).order_by(Page.id)]
+
+    for page_id in page_ids:
+        _delete_page_invites(page_id)
+        db.session.commit()
+        _delete_page_contents(page_id, current_app.config['PAGE_DELETE_BATCH_SIZE'])
 
-    # Delete the page
-    db.session.delete(page)
+    return len(page_ids)
 
-    # Commit the changes
+
+def _delete_page_invites(page_id):
+    """
+    Deletes the invites of a page. Must be committed by the caller.
+    :param page_id: the id of the page
+    :return:
+    """
+    invited_user_ids = [user_id for user_id, in db.session.query(Invite.user_id).filter_by(page_id=page_id)]
+    Invite.query.filter_by(page_id=page_id).delete(synchronize_session=False)
+    _bump_user_versions(invited_user_ids)
+
+
+def _lock_page(page_id):
+    """
+    Locks the row of a page until the end of the transaction, so the last user leaving a page and the acceptance
+    of one of its invites run one after the other. SQLite has no row locks, but runs one write transaction at a time.
+    :param page_id: the id of the page
+    :return: the id of the page, or None if it does not exist
+    """
+    return db.session.query(Page.id).filter_by(id=page_id).with_for_update().scalar()
+
+
+def _delete_page_contents(page_id, batch_size):
+    """
+    Deletes the posts of a page in batches, committing after each batch so locks are held briefly, and then
+    deletes the page itself.
+    :param page_id: the id of the page
+    :param batch_size: the maximum amount of posts deleted per statement
+    :return:
+    """
+    while True:
+        post_ids = [post_id for post_id, in db.session.query(Post.id).filter_by(page_id=page_id).order_by(Post.id).limit(batch_size)]
+        if not post_ids:
+            break
+
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+    # Delete the deleted post tombstones and the page
+    DeletedPost.query.filter_by(page_id=page_id).delete(synchronize_session=False)
+    Page.query.filter_by(id=page_id).delete(synchronize_session=False)
     db.session.commit()
 
 
@@ -333,68 +416,301 @@ def view_page(page_id):
     add_user_form = UserForm()
 
     # See if user has access to page
-    page = Page.query.filter_by(id=page_id).first()
-    if not _user_has_access(page):
+    if not _user_has_access(page_id):
         abort(403)
+    page = Page.query.filter_by(id=page_id).first()
 
     return render_template('page.html', page=page, post_add_form=post_add_form, add_user_form=add_user_form)
 
 
-def _user_has_access(page):
+def _user_has_access(page_id):
     """
-    Checks if user can access the page.
-    :param page: the page the user is trying to access
+    Checks if user can access the page with a single primary key lookup of the user's access row,
+    which is remembered for the rest of the request.
+    :param page_id: the id of the page the user is trying to access
     :return: true if user can access the page, false otherwise
     """
-    # Check if page exists
-    if page is None:
-        return False
-
-    # Check if user has access to page
-    if not any(user.id == current_user.id for user in page.users):
-        return False
-
-    return True
+    return get_user_access(page_id) is not None
 
 
 @bp.route('/page/<int:page_id>/init-get', methods=['GET'])
 @login_required
+@max_queries(4)
+@compressible
 def page_init_get(page_id):
     """
-    Get the necessary objects for page loading for an individual page
+    Get the necessary objects for page loading for an individual page. Only the newest posts are sent,
+    older posts can be loaded with the before cursor.
     :param page_id: id of the page
     :return:
     """
 
     # See if user has access to page
-    page = Page.query.filter_by(id=page_id).first()
-    if not _user_has_access(page):
+    if not _user_has_access(page_id):
         abort(403)
 
-    # Retrieve all the posts associated with the page
-    posts = _get_posts(page_id)
+    # Answer without querying the posts if the client's copy is up to date
+    version = db.session.query(Page.version).filter_by(id=page_id).scalar()
+    etag = _make_etag("page", page_id, version, current_user.id)
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
 
-    # Retrieve the user and page in order to get key information
-    user = User.query.filter_by(id=current_user.id).first()
-    user_access = next((user_access for user_access in user.user_access if user_access.page_id == page_id), None)
+    # Retrieve a single page of posts associated with the page
+    before, after, limit = _get_cursor_args()
+    posts, has_more = _get_posts(page_id, before=before, after=after, limit=limit)
+    user = get_current_user()
 
-    return jsonify({"success": True, "posts": posts, "current_username": user.username, "browser_key": user.browser_encryption_key, "page_key": user_access.encrypted_key})
+    # The keys are sent by page_keys, since this response is compressed
+    return _with_etag(stream_json({"success": True, "posts": posts, "has_more": has_more, "version": version, "current_username": user.username}), etag)
 
 
-def _get_posts(page_id):
+@bp.route('/page/<int:page_id>/keys', methods=['GET'])
+@login_required
+def page_keys(page_id):
     """
-    Retrieves the posts associated with a given page.
-    :param page_id: the id of the page
+    Returns the keys for decrypting a page, the user's browser key and the page key encrypted with the user's
+    AES key. Never compressed, unlike the responses with the page's posts.
+    :param page_id: id of the page
+    :return: json object containing the keys
+    """
+    if not _user_has_access(page_id):
+        abort(403)
+
+    user = get_current_user()
+    response = jsonify({"success": True, "current_username": user.username, "browser_key": user.browser_encryption_key, "page_key": get_user_access(page_id).encrypted_key})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _make_etag(*parts):
+    """
+    Creates a strong ETag from the parts identifying a response and the request's query string.
+    :param parts: the values the response depends on, such as ids and versions
+    :return: the ETag
+    """
+    tag = repr(parts).encode('utf-8') + b"?" + request.query_string
+    return hashlib.sha256(tag).hexdigest()[:32]
+
+
+def _not_modified(etag):
+    """
+    Returns an empty 304 Not Modified response.
+    :param etag: the ETag of the client's up to date copy
+    :return: the response
+    """
+    return _with_etag(Response(status=304), etag)
+
+
+def _with_etag(response, etag):
+    """
+    Adds a strong ETag to a response, and requires clients to revalidate their cached copy. The compression
+    of the response, if any, makes the ETag weak afterwards.
+    :param response: the response
+    :param etag: the ETag
+    :return: the response
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@bp.route('/page/<int:page_id>/posts', methods=['GET'])
+@login_required
+@compressible
+def page_get_posts(page_id):
+    """
+    Returns a single page of posts for loading older (before cursor) or newer (after cursor) posts.
+    :param page_id: id of the page
     :return:
     """
-    database_posts = Post.query.filter_by(page_id=page_id).options(joinedload(Post.user)).all()
+    # See if user has access to page
+    if not _user_has_access(page_id):
+        abort(403)
+
+    before, after, limit = _get_cursor_args()
+    posts, has_more = _get_posts(page_id, before=before, after=after, limit=limit)
+
+    return stream_json({"success": True, "posts": posts, "has_more": has_more, "current_username": get_current_user().username})
+
+
+def _get_cursor_args():
+    """
+    Reads the pagination cursor from the request arguments. The page size is clamped
+    between 1 and the configured maximum.
+    :return: before post id, after post id, and the page size
+    """
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+
+    return before, after, _get_limit_arg('POSTS_PAGE_SIZE')
+
+
+def _get_limit_arg(default_setting):
+    """
+    Reads the page size from the request arguments, clamped between 1 and MAX_PAGE_SIZE.
+    :param default_setting: name of the setting holding the default page size
+    :return: the page size
+    """
+    limit = request.args.get('limit', default=current_app.config[default_setting], type=int)
+    return max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def _get_posts(page_id, before=None, after=None, limit=None):
+    """
+    Retrieves a page of posts associated with a given page, ordered from oldest to newest. Without a cursor
+    the newest posts are returned.
+    :param page_id: the id of the page
+    :param before: only return posts with an id lower than this id
+    :param after: only return posts with an id higher than this id
+    :param limit: the maximum amount of posts to return (default POSTS_PAGE_SIZE)
+    :return: the posts, and whether there are more posts in the direction of the cursor
+    """
+    if limit is None:
+        limit = current_app.config['POSTS_PAGE_SIZE']
+
+    query = Post.query.filter(Post.page_id == page_id).options(joinedload(Post.user))
+
+    # Walk forwards from the after cursor, otherwise walk backwards from the newest post or the before cursor
+    if after is not None:
+        query = query.filter(Post.id > after).order_by(Post.id.asc())
+    else:
+        if before is not None:
+            query = query.filter(Post.id < before)
+        query = query.order_by(Post.id.desc())
+
+    # Fetch one extra row to find out if there are more posts
+    database_posts = query.limit(limit + 1).all()
+    has_more = len(database_posts) > limit
+    database_posts = database_posts[:limit]
+
+    if after is None:
+        database_posts.reverse()
+
+    timestamps = _get_post_timestamps(database_posts)
     posts = []
 
     for post in database_posts:
-        post_created_date_time = aes_decrypt(post.created_at, database_key).split()
-        posts.append({"id": post.id, "message": post.encrypted_message, "user": post.user.username, "date": post_created_date_time[0], "time": post_created_date_time[1]})
+        posts.append(_post_to_json(post, post.user.username, timestamps[post.id]))
+
+    return posts, has_more
+
+
+def _get_post_timestamps(posts):
+    """
+    Returns the decrypted creation times of posts. Cached times are reused, the rest are decrypted in one batch.
+    :param posts: the posts
+    :return: dictionary of post id to decrypted creation time
+    """
+    timestamps = {}
+    uncached_posts = []
 
-    return posts
+    for post in posts:
+        created_at = timestamp_cache.get((post.id, post.created_at))
+        if created_at is None:
+            uncached_posts.append(post)
+        else:
+            timestamps[post.id] = created_at
+
+    if uncached_posts:
+        decrypted = aes_decrypt_many([post.created_at for post in uncached_posts], database_key)
+        for post, created_at in zip(uncached_posts, decrypted):
+            timestamps[post.id] = created_at
+            timestamp_cache.put((post.id, post.created_at), created_at)
+
+    return timestamps
+
+
+def _post_to_json(post, username, created_at):
+    """
+    Converts a post into its json representation.
+    :param post: the post
+    :param username: the username of the post's creator
+    :param created_at: the decrypted creation time of the post
+    :return: dictionary representing the post
+    """
+    post_created_date_time = created_at.split()
+    return {"id": post.id, "message": post.encrypted_message, "user": username, "date": post_created_date_time[0], "time": post_created_date_time[1]}
+
+
+@bp.route('/page/<int:page_id>/changes', methods=['GET'])
+@login_required
+@compressible
+def page_get_changes(page_id):
+    """
+    Returns the posts added and deleted since a given page version. If the client is too far behind,
+    it is told to reset and reload the page.
+    :param page_id: id of the page
+    :return:
+    """
+    if not _user_has_access(page_id):
+        abort(403)
+    page = Page.query.filter_by(id=page_id).first()
+
+    since = request.args.get('since', type=int)
+    max_changes = current_app.config['MAX_PAGE_SIZE']
+
+    # Tombstones older than the retention window may have been swept
+    if since is None or since < page.version - current_app.config['TOMBSTONE_RETENTION'] or since < 0 or since > page.version:
+        return jsonify({"success": True, "reset": True, "version": page.version})
+
+    # Fetch one extra row of each to find out if there are too many changes
+    new_posts = Post.query.filter(Post.page_id == page_id, Post.version > since).options(joinedload(Post.user)).order_by(Post.id.asc()).limit(max_changes + 1).all()
+    deleted_posts = DeletedPost.query.filter(DeletedPost.page_id == page_id, DeletedPost.version > since).order_by(DeletedPost.version.asc()).limit(max_changes + 1).all()
+
+    if len(new_posts) + len(deleted_posts) > max_changes:
+        return jsonify({"success": True, "reset": True, "version": page.version})
+
+    timestamps = _get_post_timestamps(new_posts)
+    posts = [_post_to_json(post, post.user.username, timestamps[post.id]) for post in new_posts]
+    deleted = [deleted_post.post_id for deleted_post in deleted_posts]
+
+    return stream_json({"success": True, "new_posts": posts, "deleted_posts": deleted, "version": page.version, "current_username": get_current_user().username})
+
+
+@bp.route('/page/<int:page_id>/events', methods=['GET'])
+@login_required
+def page_events(page_id):
+    """
+    Streams the page's post-created and post-deleted events as server-sent events. The stream is closed
+    after EVENTS_STREAM_TIMEOUT seconds so the client reconnects and access is checked again.
+    :param page_id: id of the page
+    :return: event stream response
+    """
+    if not _user_has_access(page_id):
+        abort(403)
+
+    stream = event_stream.stream(page_id, current_app.config['EVENTS_KEEPALIVE'], current_app.config['EVENTS_STREAM_TIMEOUT'])
+
+    # The generator does not use the request context, so the database session is released before streaming
+    return Response(stream, mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _get_user_version():
+    """
+    Returns the version of the current user's dashboard and invites.
+    :return: the version
+    """
+    return db.session.query(User.version).filter_by(id=current_user.id).scalar()
+
+
+def _bump_user_versions(user_ids):
+    """
+    Increments the dashboard and invites version of users. Must be committed by the caller.
+    :param user_ids: the ids of the users
+    :return:
+    """
+    if user_ids:
+        User.query.filter(User.id.in_(user_ids)).update({User.version: User.version + 1}, synchronize_session=False)
+
+
+def _bump_page_version(page_id):
+    """
+    Atomically increments the version of a page. Must be committed by the caller.
+    :param page_id: the id of the page
+    :return: the new version of the page
+    """
+    Page.query.filter_by(id=page_id).update({Page.version: Page.version + 1}, synchronize_session=False)
+    return db.session.query(Page.version).filter_by(id=page_id).scalar()
 
 
 @bp.route('/page/<int:page_id>/add-post', methods=['POST'])
@@ -408,27 +724,30 @@ def add_post(page_id):
     post_add_form = PostCreateForm()
 
     # Check if user has access to this request
-    if not _user_has_access(Page.query.filter_by(id=page_id).first()):
+    if not _user_has_access(page_id):
         abort(403)
 
     # If post submission was valid, add the post
     if post_add_form.validate_on_submit():
         # Get and encrypt the current time for the timestamp
-        encrypted_time = aes_encrypt(str(datetime.now()), database_key)
+        created_at = str(datetime.now())
+        encrypted_time = aes_encrypt(created_at, database_key)
+
+        username = get_current_user().username
 
         # Add the post to the database
-        new_post = Post(encrypted_message=post_add_form.encrypted_message.data, user_id=current_user.id, page_id=page_id, created_at=encrypted_time)
+        version = _bump_page_version(page_id)
+        new_post = Post(encrypted_message=post_add_form.encrypted_message.data, user_id=current_user.id, page_id=page_id, created_at=encrypted_time, version=version)
         db.session.add(new_post)
         db.session.commit()
+        timestamp_cache.put((new_post.id, encrypted_time), created_at)
 
-        # Retrieve all the posts associated with the page
-        posts = _get_posts(page_id)
-
-        # Retrieve the user and page in order to get key information
-        user = User.query.filter_by(id=current_user.id).first()
-        user_access = next((user_access for user_access in user.user_access if user_access.page_id == page_id), None)
+        # Notify the page's live subscribers
+        post_json = _post_to_json(new_post, username, created_at)
+        event_stream.publish(page_id, {"type": "post-created", "version": version, "post": post_json})
 
-        return jsonify({"success": True, "posts": posts, "current_username": user.username, "browser_key": user.browser_encryption_key, "page_key": user_access.encrypted_key})
+        # Only send back the new post
+        return jsonify({"success": True, "new_posts": [post_json], "version": version, "current_username": username})
 
     flash("Could not add post", "error")
     return jsonify({"success": False, "flash": True})
@@ -446,33 +765,48 @@ def delete_post(page_id, post_id):
     form = DeletePostForm()
 
     # Check if user has access to this request
-    if not _user_has_access(Page.query.filter_by(id=page_id).first()):
+    if not _user_has_access(page_id):
         abort(403)
 
     if form.validate_on_submit():
         # Check if user has access to post
-        post = Post.query.filter_by(id=post_id).first()
-        if post.user_id != current_user.id:
+        post = Post.query.filter_by(id=post_id, page_id=page_id).first()
+        if post is None or post.user_id != current_user.id:
             return jsonify({"success": False})
 
-        # Delete the post
+        # Delete the post and leave a tombstone for syncing clients
+        version = _bump_page_version(page_id)
+        cache_key = (post.id, post.created_at)
         db.session.delete(post)
+        db.session.add(DeletedPost(post_id=post_id, page_id=page_id, version=version))
+        _sweep_tombstones(page_id, version)
         db.session.commit()
+        timestamp_cache.pop(cache_key)
 
-        # Retrieve all the posts associated with the page
-        posts = _get_posts(page_id)
+        # Notify the page's live subscribers
+        event_stream.publish(page_id, {"type": "post-deleted", "version": version, "post_id": post_id})
 
-        # Retrieve the user and page in order to get key information
-        user = User.query.filter_by(id=current_user.id).first()
-        user_access = next((user_access for user_access in user.user_access if user_access.page_id == page_id), None)
-
-        return jsonify({"success": True, "posts": posts, "current_username": user.username,
-                        "browser_key": user.browser_encryption_key, "page_key": user_access.encrypted_key})
+        # Only send back the deleted post id
+        return jsonify({"success": True, "deleted_posts": [post_id], "version": version, "current_username": current_user.username})
 
     flash("Could not delete post", "error")
     return jsonify({"success": False, "flash": True})
 
 
+def _sweep_tombstones(page_id, version):
+    """
+    Deletes the tombstones of a page that are older than TOMBSTONE_RETENTION versions. Clients that are further
+    behind are told to reset by page_get_changes, so they never need the swept tombstones. Must be committed by
+    the caller.
+    :param page_id: the id of the page
+    :param version: the current version of the page
+    :return:
+    """
+    horizon = version - current_app.config['TOMBSTONE_RETENTION']
+    if horizon > 0:
+        DeletedPost.query.filter(DeletedPost.page_id == page_id, DeletedPost.version <= horizon).delete(synchronize_session=False)
+
+
 @bp.route('/page/<int:page_id>/invite-user/request', methods=['POST'])
 def existing_page_invite_request(page_id):
     """
@@ -481,17 +815,17 @@ def existing_page_invite_request(page_id):
     """
     add_user_form = UserForm()
 
-    page = Page.query.filter_by(id=page_id).first()
-    if not _user_has_access(page):
+    if not _user_has_access(page_id):
         abort(403)
+    page = Page.query.filter_by(id=page_id).first()
 
     # Add user to page
     if add_user_form.validate_on_submit():
         if _validate_invite(add_user_form.new_user.data, page):
-            user_access = UserAccess.query.filter_by(user_id=current_user.id, page_id=page_id).first()
-            invited_user = User.query.filter_by(username=add_user_form.new_user.data).first()
+            user_access = get_user_access(page_id)
+            invited_user = key_directory.get(add_user_form.new_user.data)
 
-            return jsonify({"success": True, "invite_public_key": invited_user.public_key, "browser_key": user_access.user.browser_encryption_key, "encrypted_page_key": user_access.encrypted_key})
+            return jsonify({"success": True, "invite_public_key": invited_user.public_key, "browser_key": get_current_user().browser_encryption_key, "encrypted_page_key": user_access.encrypted_key})
 
     flash("Could not invite user", "error")
     return jsonify({"success": False, "flash": True})
@@ -508,26 +842,129 @@ def existing_page_invite(page_id):
     """
     invite_user_form = InviteUserForm()
 
-    page = Page.query.filter_by(id=page_id).first()
-    if not _user_has_access(page):
+    if not _user_has_access(page_id):
         abort(403)
+    page = Page.query.filter_by(id=page_id).first()
 
     # Add user to page
     if invite_user_form.validate_on_submit():
         if _validate_invite(invite_user_form.new_user.data, page):
-            invited_user = User.query.filter_by(username=invite_user_form.new_user.data).first()
+            invited_user = key_directory.get(invite_user_form.new_user.data)
             invite = Invite(page_id=page_id, user_id=invited_user.id, encrypted_key=invite_user_form.encrypted_key.data)
-            db.session.add(invite)
-            db.session.commit()
-
-            user = User.query.filter_by(id=current_user.id).first()
 
-            return jsonify({"success": True, "current_username": user.username})
+            try:
+                db.session.add(invite)
+                _bump_page_version(page_id)
+                _bump_user_versions([invited_user.id])
+                db.session.commit()
+            except IntegrityError:
+                # Another request invited the user in the meantime
+                db.session.rollback()
+            else:
+                user = get_current_user()
+                return jsonify({"success": True, "current_username": user.username})
 
     flash("Could not invite user", "error")
     return jsonify({"success": False, "flash": True})
 
 
+@bp.route('/page/<int:page_id>/invite-users/request', methods=['POST'])
+@login_required
+def existing_page_batch_invite_request(page_id):
+    """
+    Requests the key information of multiple invited users at once.
+    :param page_id: id of the page
+    :return: json response
+    """
+    batch_user_form = BatchUserForm()
+
+    if not _user_has_access(page_id):
+        abort(403)
+
+    if batch_user_form.validate_on_submit():
+        usernames = list(dict.fromkeys(batch_user_form.new_users.data))
+        invited_users = _get_invitable_users(usernames, page_id)
+        rejected = [username for username in usernames if username not in invited_users]
+
+        # Listed even when no one can be invited, so the user sees which usernames failed
+        if not invited_users:
+            return jsonify({"success": False, "rejected": rejected})
+
+        user_access = get_user_access(page_id)
+        public_keys = [{"username": username, "key": invited_users[username].public_key} for username in usernames if username in invited_users]
+
+        return jsonify({"success": True, "invite_public_keys": public_keys, "rejected": rejected, "browser_key": get_current_user().browser_encryption_key, "encrypted_page_key": user_access.encrypted_key})
+
+    flash("Could not invite users", "error")
+    return jsonify({"success": False, "flash": True})
+
+
+@bp.route('/page/<int:page_id>/invite-users', methods=['POST'])
+@login_required
+def existing_page_batch_invite(page_id):
+    """
+    Adds multiple users to an existing page. Either all the users are invited or none of them.
+
+    :param page_id: id of the page
+    :return: json response
+    """
+    batch_invite_form = BatchInviteUserForm()
+
+    if not _user_has_access(page_id):
+        abort(403)
+
+    if batch_invite_form.validate_on_submit():
+        requested_invited_users = {}
+        for user in batch_invite_form.encrypted_keys.data:
+            requested_invited_users[user['username']] = user['key']
+
+        invited_users = _get_invitable_users(list(requested_invited_users), page_id)
+
+        if len(invited_users) == len(requested_invited_users):
+            invites = [{"page_id": page_id, "user_id": invited_user.id, "encrypted_key": requested_invited_users[username]}
+                       for username, invited_user in invited_users.items()]
+
+            try:
+                db.session.execute(insert(Invite), invites)
+                _bump_page_version(page_id)
+                _bump_user_versions([invited_user.id for invited_user in invited_users.values()])
+                db.session.commit()
+            except IntegrityError:
+                # Another request invited one of the users in the meantime
+                db.session.rollback()
+            else:
+                user = get_current_user()
+                return jsonify({"success": True, "invited_users": list(invited_users), "current_username": user.username})
+
+    flash("Could not invite users", "error")
+    return jsonify({"success": False, "flash": True})
+
+
+def _get_invitable_users(usernames, page_id):
+    """
+    Finds which users of a list can be invited to a page, resolving the users through the public key
+    directory and querying the page's members and invites among them.
+
+    :param usernames: usernames of the people to be invited
+    :param page_id: id of the page the users are to be invited to
+    :return: dictionary of the invitable users' public keys by username
+    """
+    current_username = get_current_user().username
+    usernames = [username for username in set(usernames) if username != current_username]
+    if not usernames:
+        return {}
+
+    users = key_directory.resolve(usernames).values()
+    if not users:
+        return {}
+
+    user_ids = [user.id for user in users]
+    unavailable_ids = set(db.session.scalars(db.select(UserAccess.user_id).filter(UserAccess.page_id == page_id, UserAccess.user_id.in_(user_ids))))
+    unavailable_ids.update(db.session.scalars(db.select(Invite.user_id).filter(Invite.page_id == page_id, Invite.user_id.in_(user_ids))))
+
+    return {user.username: user for user in users if user.id not in unavailable_ids}
+
+
 @bp.route('/pages/invites', methods=['GET'])
 @login_required
 def page_invites():
@@ -540,31 +977,48 @@ def page_invites():
 
 @bp.route('/pages/invites/init-get', methods=['GET'])
 @login_required
+@max_queries(4)
 def page_invites_init_get():
     """
     Returns the objects necessary for loading page invites.
     :return:
     """
-    # Get invites
-    user_invites = _get_invites()
+    # Answer without querying the invites if the client's copy is up to date
+    etag = _make_etag("invites", current_user.id, _get_user_version())
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    # Get a single page of invites
+    after = request.args.get('after', type=int)
+    user_invites, has_more = _get_invites(after=after, limit=_get_limit_arg('INVITES_PAGE_SIZE'))
 
-    # Get user for keys
-    user = User.query.filter_by(id=current_user.id).first()
+    # Get user for keys, the private key is not part of the cached identity
+    user = get_current_user()
+    encrypted_private_key = db.session.query(User.encrypted_private_key).filter_by(id=user.id).scalar()
 
-    return jsonify({"success": True, "invites": user_invites, "current_username": user.username, "encrypted_private_key": user.encrypted_private_key, "browser_key": user.browser_encryption_key})
+    return _with_etag(jsonify({"success": True, "invites": user_invites, "has_more": has_more, "current_username": user.username, "encrypted_private_key": encrypted_private_key, "browser_key": user.browser_encryption_key}), etag)
 
 
-def _get_invites():
+def _get_invites(after=None, limit=None):
     """
-    Helper method for getting the user's invites
-    :return: user's invites
+    Helper method for getting the user's invites, ordered by invite id.
+    :param after: only return invites with an id higher than this id
+    :param limit: the maximum amount of invites to return (default INVITES_PAGE_SIZE)
+    :return: user's invites, and whether there are more invites after these
     """
-    database_invites = Invite.query.filter_by(user_id=current_user.id)
-    user_invites = []
-    for invite in database_invites:
-        user_invites.append({"id": invite.id, "title": invite.page.encrypted_title, "key": invite.encrypted_key})
+    if limit is None:
+        limit = current_app.config['INVITES_PAGE_SIZE']
 
-    return user_invites
+    # Load only the needed columns of the invites and their page titles in a single query
+    query = db.session.query(Invite.id, Page.encrypted_title, Invite.encrypted_key).join(Page, Page.id == Invite.page_id).filter(Invite.user_id == current_user.id)
+    if after is not None:
+        query = query.filter(Invite.id > after)
+
+    # Fetch one extra row to find out if there are more invites
+    rows = query.order_by(Invite.id.asc()).limit(limit + 1).all()
+    user_invites = [{"id": invite_id, "title": encrypted_title, "key": encrypted_key} for invite_id, encrypted_title, encrypted_key in rows[:limit]]
+
+    return user_invites, len(rows) > limit
 
 
 @bp.route("/pages/accept-invite/<int:invite_id>", methods=['POST'])
@@ -578,23 +1032,28 @@ def page_accept_invite(invite_id):
     form = AcceptInviteForm()
 
     if form.validate_on_submit():
-        invite = Invite.query.filter_by(id=invite_id).first()
+        invite = db.session.get(Invite, invite_id)
 
         # Check if user has access
         if not _user_has_invite(invite):
             return jsonify({"success": False})
 
+        # Lock the page and check the invite again, since the page's last user may have deleted it meanwhile
+        _lock_page(invite.page_id)
+        if Invite.query.filter_by(id=invite_id).with_for_update().first() is None:
+            db.session.rollback()
+            return jsonify({"success": False})
+
         # Add user to page and remove invite
         new_user_access = UserAccess(user_id=invite.user_id, page_id=invite.page_id, encrypted_key=form.encrypted_key.data)
         db.session.add(new_user_access)
         db.session.delete(invite)
+        _bump_page_version(invite.page_id)
+        _bump_user_versions([current_user.id])
         db.session.commit()
 
-        # Get user for keys
-        user = User.query.filter_by(id=current_user.id).first()
-
-        user_invites = _get_invites()
-        return jsonify({"success": True, "invites": user_invites, "current_username": user.username, "encrypted_private_key": user.encrypted_private_key, "browser_key": user.browser_encryption_key})
+        # Only send back the removed invite id
+        return jsonify({"success": True, "removed_invite": invite_id, "current_username": current_user.username})
 
     return jsonify({"success": False})
 
@@ -607,7 +1066,7 @@ def page_decline_invite(invite_id):
     :param invite_id: the id of the invite
     :return:
     """
-    invite = Invite.query.filter_by(id=invite_id).first()
+    invite = db.session.get(Invite, invite_id)
 
     # Check if user has access
     if not _user_has_invite(invite):
@@ -615,13 +1074,12 @@ def page_decline_invite(invite_id):
 
     # Remove invite
     db.session.delete(invite)
+    _bump_page_version(invite.page_id)
+    _bump_user_versions([current_user.id])
     db.session.commit()
 
-    # Get user for key
-    user = User.query.filter_by(id=current_user.id).first()
-
-    user_invites = _get_invites()
-    return jsonify({"success": True, "invites": user_invites, "current_username": user.username, "encrypted_private_key": user.encrypted_private_key, "browser_key": user.browser_encryption_key})
+    # Only send back the removed invite id
+    return jsonify({"success": True, "removed_invite": invite_id, "current_username": current_user.username})
 
 
 def _user_has_invite(invite):
@@ -0,0 +1,180 @@
+"""
+Sampling profiler for slow requests. While it is enabled, a background thread samples the stacks of the threads
+handling requests with sys._current_frames. When a request takes longer than PROFILER_THRESHOLD, its samples are
+written to PROFILER_DIR as collapsed stacks, one "frame;frame;frame count" line per distinct stack, which
+flamegraph tools such as flamegraph.pl and speedscope read directly. Captures are rate limited by
+PROFILER_CAPTURE_INTERVAL.
+
+The profiler is toggled on /profiler, which only answers requests that carry PROFILER_TOKEN as a bearer token and
+come from the addresses in PROFILER_ALLOWED_ADDRESSES. Every worker process has its own profiler, so a toggle only
+affects the worker that answered it.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import abort, g, jsonify, request
+from app.access import is_operator_request
+
+logger = logging.getLogger(__name__)
+
+
+class SlowRequestProfiler:
+    """
+    Extension object that samples the requests of this worker and writes the stacks of slow ones to files.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.threshold = 1.0
+        self.interval = 0.005
+        self.capture_interval = 60
+        self.directory = None
+        self.token = None
+        self.allowed_addresses = ()
+        self._active = {}
+        self._thread = None
+        self._last_capture = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Registers the request hooks and the /profiler endpoint. Must be called after the CSRF extension
+        is initialized.
+        :param app: the application
+        :return:
+        """
+        self.threshold = app.config.get('PROFILER_THRESHOLD', 1.0)
+        self.interval = app.config.get('PROFILER_SAMPLE_INTERVAL', 0.005)
+        self.capture_interval = app.config.get('PROFILER_CAPTURE_INTERVAL', 60)
+        self.directory = app.config['PROFILER_DIR']
+        self.token = app.config.get('PROFILER_TOKEN')
+        self.allowed_addresses = tuple(app.config.get('PROFILER_ALLOWED_ADDRESSES', ('127.0.0.1', '::1')))
+
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/profiler', 'profiler', self._toggle_view, methods=['GET', 'POST'])
+
+        # The toggle needs a bearer token, which browsers never send on their own
+        app.extensions['csrf'].exempt(self._toggle_view)
+
+        if app.config.get('PROFILER_ENABLED', False):
+            self.set_enabled(True)
+
+    def set_enabled(self, enabled):
+        """
+        Turns the sampling of this worker's requests on or off.
+        :param enabled: true to sample requests, false to stop
+        :return:
+        """
+        with self._lock:
+            self.enabled = enabled
+            if not enabled:
+                self._active.clear()
+            elif self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def _toggle_view(self):
+        if not is_operator_request(self.token, self.allowed_addresses):
+            abort(404)
+
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict) or not isinstance(data.get('enabled'), bool):
+                return jsonify({"success": False}), 400
+            self.set_enabled(data['enabled'])
+
+        return jsonify({"success": True, "enabled": self.enabled, "worker": os.getpid(), "threshold": self.threshold})
+
+    def _start_request(self):
+        if not self.enabled:
+            return
+
+        g.profiler_start = time.perf_counter()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def _finish_request(self, exception=None):
+        start = g.pop('profiler_start', None)
+        if start is None:
+            return
+
+        duration = time.perf_counter() - start
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+            if not stacks or duration < self.threshold or time.monotonic() - self._last_capture < self.capture_interval:
+                return
+            self._last_capture = time.monotonic()
+
+            # Copied, since the sampler may still be adding a sample it took before the request finished
+            stacks = Counter(stacks)
+
+        try:
+            path = self._write_capture(stacks, request.endpoint or 'unknown', duration)
+        except OSError:
+            logger.exception("Could not write the profile of a slow request to %s", request.path)
+            return
+        logger.warning("Profiled slow request to %s (%.0f ms), stacks written to %s", request.path, duration * 1000, path)
+
+    def _write_capture(self, stacks, endpoint, duration):
+        """
+        Writes the sampled stacks of a request in the collapsed stack format.
+        :param stacks: counter of the number of samples of each collapsed stack
+        :param endpoint: the endpoint of the request
+        :param duration: the seconds the request took
+        :return: the path of the written file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = "%s-%d-%s-%dms.folded" % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), endpoint, duration * 1000)
+        path = os.path.join(self.directory, name)
+
+        with open(path, 'w') as file:
+            for stack, count in stacks.most_common():
+                file.write("%s %d\n" % (stack, count))
+
+        return path
+
+    def _sample(self):
+        # Samples the active requests until the profiler is turned off
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.enabled:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+
+            frames = sys._current_frames()
+            samples = [(stacks, _collapse(frames[thread_id])) for thread_id, stacks in active if thread_id in frames]
+            with self._lock:
+                for stacks, stack in samples:
+                    stacks[stack] += 1
+
+
+def _collapse(frame):
+    """
+    Collapses a stack into one line, from the outermost frame to the innermost.
+    :param frame: the innermost frame
+    :return: the frames separated by semicolons
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append("%s (%s:%d)" % (code.co_name, _short_path(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _short_path(filename):
+    # The file and its directory, enough to tell modules apart without the install location
+    directory, name = os.path.split(filename)
+    return os.path.join(os.path.basename(directory), name)
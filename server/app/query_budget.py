@@ -0,0 +1,118 @@
+"""
+Query budgets for development and staging. Counts the SQL statements each request runs and warns when a request
+runs more than its budget, listing the statements it repeated, so N+1 query patterns are noticed before they
+reach production. The budget is set globally with QUERY_BUDGET and can be overridden per route with max_queries.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import json
+import logging
+import re
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Lists of bound parameters, such as the values of an IN clause, which differ in length between calls
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)")
+
+# Number of repeated statements listed in a warning
+_REPEATED_LIMIT = 5
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    Raised in test mode when a request runs more SQL statements than its budget.
+    """
+
+
+def max_queries(limit):
+    """
+    Decorator overriding the query budget of a route. Place it below the route decorator.
+    :param limit: the maximum number of SQL statements the route may run
+    :return: the decorator
+    """
+    def decorator(view):
+        view.max_queries = limit
+        return view
+
+    return decorator
+
+
+class QueryBudget:
+    """
+    Extension object that counts the SQL statements of every request and enforces the query budgets.
+    """
+
+    def __init__(self, app=None):
+        self.default_budget = None
+        self.raise_errors = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Registers the statement counting and the budget check. Must be called after the database extension
+        is initialized.
+        :param app: the application
+        :return:
+        """
+        if not app.config.get('QUERY_BUDGET_ENABLED', False):
+            return
+
+        self.default_budget = app.config.get('QUERY_BUDGET', 20)
+        self.raise_errors = app.config.get('QUERY_BUDGET_RAISE', False)
+
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', _count_statement)
+
+        app.after_request(self._check_budget)
+
+    def _check_budget(self, response):
+        statements = g.pop('query_budget_statements', None)
+        if statements is None:
+            return response
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'max_queries', self.default_budget)
+        total = sum(statements.values())
+        if budget is None or total <= budget:
+            return response
+
+        details = {
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.path,
+            "statements": total,
+            "budget": budget,
+            "repeated": [{"statement": statement, "count": count} for statement, count in statements.most_common(_REPEATED_LIMIT) if count > 1],
+        }
+        logger.warning("Query budget exceeded: %s", json.dumps(details))
+
+        if self.raise_errors and current_app.testing:
+            raise QueryBudgetExceeded("%s ran %d SQL statements, over its budget of %d" % (request.endpoint, total, budget))
+
+        return response
+
+
+def statement_shape(statement):
+    """
+    Normalizes a SQL statement so calls that only differ in their parameters have the same shape.
+    :param statement: the SQL statement
+    :return: the statement's shape
+    """
+    return _PARAMETER_LIST.sub("(...)", " ".join(statement.split()))
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+
+    if 'query_budget_statements' not in g:
+        g.query_budget_statements = Counter()
+    g.query_budget_statements[statement_shape(statement)] += 1
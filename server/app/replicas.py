@@ -0,0 +1,91 @@
+"""
+Routing of reads to database replicas. Queries of GET requests are sent to a replica chosen for the request,
+while writes and every query outside of GET requests use the primary database. After a user writes, their
+requests read from the primary for DATABASE_REPLICA_STICKY_SECONDS, so they always see their own writes
+even if the replicas lag behind.
+
+Replicas are configured as SQLAlchemy binds, with their bind keys listed in the DATABASE_REPLICAS setting.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import random
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+# Cookie marking clients that read from the primary database after writing
+STICKY_COOKIE = 'db_primary'
+
+
+class ReplicaRouter:
+    """
+    Extension object that chooses the database replica of each request.
+    """
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self.sticky_seconds = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Reads the replica settings and registers the response hook.
+        :param app: the application
+        :return:
+        """
+        self.replicas = list(app.config.get('DATABASE_REPLICAS', []))
+        self.sticky_seconds = app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 10)
+        app.extensions['replica_router'] = self
+        app.after_request(self.mark_sticky)
+
+    def get_replica(self):
+        """
+        Returns the bind key of the replica the current request reads from.
+        :return: the bind key, or None if the request reads from the primary database
+        """
+        if not self.replicas or not has_request_context():
+            return None
+
+        if 'db_replica' not in g:
+            if request.method not in ('GET', 'HEAD') or STICKY_COOKIE in request.cookies:
+                g.db_replica = None
+            else:
+                g.db_replica = random.choice(self.replicas)
+
+        return g.db_replica
+
+    def record_write(self):
+        """
+        Records that the current request writes, so it and the client's next requests read from the primary.
+        :return:
+        """
+        if has_request_context():
+            g.db_replica = None
+            g.db_wrote = True
+
+    def mark_sticky(self, response):
+        if self.replicas and g.get('db_wrote'):
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from the replica of the current request, and writes to the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            router = current_app.extensions.get('replica_router')
+
+            if router is not None:
+                if self._flushing or getattr(clause, 'is_dml', False):
+                    router.record_write()
+                else:
+                    replica = router.get_replica()
+                    if replica is not None:
+                        return self._db.engines[replica]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
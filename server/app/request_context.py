@@ -0,0 +1,44 @@
+"""
+Request-scoped access to the current user and their page access, so each is loaded at most once per request.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+from flask import g
+from flask_login import current_user
+from app import db
+from app.models import UserAccess
+
+
+def get_current_user():
+    """
+    Returns the logged-in user as loaded by the login manager, either the cached identity or the database row
+    right after logging in. Both have the id, username and browser_encryption_key, so no query is run.
+    :return: the user
+    """
+    return current_user._get_current_object()
+
+
+def get_user_access(page_id):
+    """
+    Returns the logged-in user's access to a page by primary key, loading it at most once per request.
+    :param page_id: the id of the page
+    :return: the user's access to the page, or None if the user has no access
+    """
+    if 'user_access' not in g:
+        g.user_access = {}
+
+    if page_id not in g.user_access:
+        g.user_access[page_id] = db.session.get(UserAccess, (page_id, current_user.id))
+
+    return g.user_access[page_id]
+
+
+def forget_user_access(page_id):
+    """
+    Forgets the remembered page access after it has been changed during the request.
+    :param page_id: the id of the page
+    :return:
+    """
+    if 'user_access' in g:
+        g.user_access.pop(page_id, None)
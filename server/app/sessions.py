@@ -0,0 +1,295 @@
+"""
+Server-side sessions. Only a random session id is kept in the session cookie, and the session data is kept
+in a store shared by all the worker processes. The store is chosen with the SESSION_BACKEND setting:
+"sqlite" keeps sessions in a SQLite file, "file" keeps one file per session in a directory, "redis" keeps
+sessions in a Redis compatible server, and "cookie" keeps Flask's default signed cookie sessions.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Session ids are 32 url-safe characters, anything else in the cookie is ignored
+_SESSION_ID = re.compile(r'[A-Za-z0-9_-]{32}')
+
+
+class SessionBackend:
+    """
+    Extension object that replaces the application's session interface with the configured store.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Creates the session store from the application config.
+        :param app: the application
+        :return:
+        """
+        backend = app.config.get('SESSION_BACKEND', 'cookie')
+
+        if backend == 'cookie':
+            return
+        elif backend == 'sqlite':
+            self.store = SQLiteSessionStore(app.config['SESSION_SQLITE_PATH'])
+        elif backend == 'file':
+            self.store = FileSessionStore(app.config['SESSION_FILE_DIR'])
+        elif backend == 'redis':
+            if redis is None:
+                raise RuntimeError("The redis session backend needs the redis package")
+            self.store = RedisSessionStore(redis.Redis.from_url(app.config['SESSION_REDIS_URL']))
+        else:
+            raise ValueError("Unknown session backend: %s" % backend)
+
+        app.session_interface = ServerSessionInterface(self.store, app.config.get('SESSION_LIFETIME', 86400),
+                                                       app.config.get('SESSION_SWEEP_INTERVAL', 300))
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session whose data is kept in a session store.
+    """
+
+    def __init__(self, initial=None, sid=None, expires_at=0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+        self.regenerated = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def regenerate(self):
+        """
+        Moves the session to a new session id, such as after logging in.
+        :return:
+        """
+        self.regenerated = True
+        self.modified = True
+
+
+def regenerate_session(session):
+    """
+    Moves a server-side session to a new session id. Does nothing for cookie sessions.
+    :param session: the current session
+    :return:
+    """
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Session interface that keeps the session id in the cookie and the session data in a store. Unchanged
+    sessions are only written again once half of their lifetime has passed.
+    """
+    serializer = session_json_serializer
+
+    def __init__(self, store, lifetime, sweep_interval):
+        self.store = store
+        self.lifetime = lifetime
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+
+        if sid is not None and _SESSION_ID.fullmatch(sid):
+            record = self.store.load(sid)
+            if record is not None and record[1] > time.time():
+                return ServerSession(self.serializer.loads(record[0]), sid=sid, expires_at=record[1])
+
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Remove emptied sessions
+        if not session:
+            if session.sid is not None and session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       partitioned=self.get_cookie_partitioned(app), samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        now = time.time()
+        if not session.modified and session.sid is not None and session.expires_at - now > self.lifetime / 2:
+            return
+
+        sid = session.sid
+        if sid is None or session.regenerated:
+            if sid is not None:
+                self.store.delete(sid)
+            sid = secrets.token_urlsafe(24)
+
+        self.store.save(sid, self.serializer.dumps(dict(session)), now + self.lifetime)
+
+        # Sweep expired sessions
+        if now - self._last_sweep > self.sweep_interval:
+            self._last_sweep = now
+            self.store.sweep(now)
+
+        if sid != session.sid or session.permanent:
+            response.set_cookie(name, sid, expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                partitioned=self.get_cookie_partitioned(app), samesite=self.get_cookie_samesite(app))
+
+
+class SQLiteSessionStore:
+    """
+    Store that keeps sessions in a SQLite file. Every thread keeps its own connection open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+        connection = self.connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS session (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_session_expires_at ON session (expires_at)")
+        connection.commit()
+
+    def connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, sid):
+        return self.connect().execute("SELECT data, expires_at FROM session WHERE id = ?", (sid,)).fetchone()
+
+    def save(self, sid, data, expires_at):
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO session (id, data, expires_at) VALUES (?, ?, ?)", (sid, data, expires_at))
+
+    def delete(self, sid):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM session WHERE id = ?", (sid,))
+
+    def sweep(self, now):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM session WHERE expires_at < ?", (now,))
+
+
+class FileSessionStore:
+    """
+    Store that keeps every session in its own file. The first line of a file is the session's expiry time.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, sid):
+        try:
+            with open(os.path.join(self.directory, sid), 'r', encoding='utf-8') as file:
+                expires_at, _, data = file.read().partition("\n")
+        except FileNotFoundError:
+            return None
+
+        try:
+            return data, float(expires_at)
+        except ValueError:
+            return None
+
+    def save(self, sid, data, expires_at):
+        # Write to a temporary file first so readers never see a partly written session
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                file.write("%r\n%s" % (expires_at, data))
+            os.replace(temporary_path, os.path.join(self.directory, sid))
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def delete(self, sid):
+        try:
+            os.unlink(os.path.join(self.directory, sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, now):
+        for sid in os.listdir(self.directory):
+            if not _SESSION_ID.fullmatch(sid):
+                continue
+
+            record = self.load(sid)
+            if record is not None and record[1] < now:
+                self.delete(sid)
+
+
+class RedisSessionStore:
+    """
+    Store that keeps sessions in a Redis compatible server, which expires them by itself. The first line of
+    a value is the session's expiry time.
+    :param client: client with Redis' get, set and delete commands
+    """
+
+    def __init__(self, client, prefix="session:"):
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, sid):
+        value = self.client.get(self.prefix + sid)
+        if value is None:
+            return None
+
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        expires_at, _, data = value.partition("\n")
+
+        try:
+            return data, float(expires_at)
+        except ValueError:
+            return None
+
+    def save(self, sid, data, expires_at):
+        self.client.set(self.prefix + sid, "%r\n%s" % (expires_at, data), ex=max(1, int(expires_at - time.time())))
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def sweep(self, now):
+        pass
@@ -1,15 +1,65 @@
+// Last page version the screen is synced with
+let page_version = null;
+
+// Encrypted keys of the page, sent separately from the posts so the responses with posts can be compressed
+let encrypted_keys = null;
+
 document.addEventListener('DOMContentLoaded', function() {
-    fetch(`/page/${page_id}/init-get`)
+    fetch(`/page/${page_id}/keys`)
+        .then(response => response.json())
+        .then(updateKeys)
+        .then(() => fetch(`/page/${page_id}/init-get`))
         .then(response => response.json())
         .then(updateScreen)
+        .then(listenForEvents)
         .catch(error => console.error('Error:', error));
 });
 
+/**
+ * Keeps the encrypted keys of the page for decrypting its posts
+ * @param data the keys data
+ */
+function updateKeys(data) {
+    if (!data['success']) {
+        throw new Error('Could not load the page keys');
+    }
+
+    encrypted_keys = {"browser_key": data['browser_key'], "page_key": data['page_key']};
+}
+
+/**
+ * Listens for the page's live post events.
+ */
+function listenForEvents() {
+    const events = new EventSource(`/page/${page_id}/events`);
+    let connected = false;
+
+    events.onopen = function() {
+        // Catch up on changes missed while reconnecting
+        if (connected) {
+            syncPosts();
+        }
+        connected = true;
+    };
+
+    events.addEventListener('post-created', function(event) {
+        const data = JSON.parse(event.data);
+        applyWriteChanges({"new_posts": [data['post']], "version": data['version']});
+    });
+
+    events.addEventListener('post-deleted', function(event) {
+        const data = JSON.parse(event.data);
+        applyWriteChanges({"deleted_posts": [data['post_id']], "version": data['version']});
+    });
+
+    events.addEventListener('resync', syncPosts);
+}
+
 /**
  * Method for starting adding a post to a page.
  */
 function addPost() {
-    fetch(`/page/${page_id}/init-get`)
+    fetch(`/page/${page_id}/keys`)
     .then(response => response.json())
     .then(addPostSubmit)
     .catch(error => console.error('Error:', error));
@@ -31,40 +81,66 @@ async function addPostSubmit(data) {
     let page_key = keys['decrypted_key'];
 
     const form = document.getElementById('post-add-form');
-    form.encrypted_message.value = encryptMessageToString(await encryptMessage(page_key, form.encrypted_message.value));
+    const message = form.encrypted_message.value;
+    form.encrypted_message.value = encryptMessageToString(await encryptMessage(page_key, message));
 
     const form_data = new FormData(form);
 
+    // Give the message back to the user while the post is sent, instead of showing its ciphertext
+    form.encrypted_message.value = message;
+
     fetch(`/page/${page_id}/add-post`, {
         method: 'POST',
         body: form_data
     })
     .then(response => response.json())
-    .then(updateScreen)
+    .then(data => {
+        // Only the user's own post clears the message box, live changes from other members leave it alone.
+        // Text typed while the post was being sent is kept
+        if (data['success'] && form.encrypted_message.value === message) {
+            form.encrypted_message.value = "";
+        }
+        return updateScreen(data);
+    })
     .catch(error => console.error('Error:', error));
 }
 
 /**
- * Starts the invitation process. Sends a request for the invited user's public keys.
+ * Starts the invitation process. Sends a request for the public keys of all the invited users.
+ * Multiple usernames can be separated with commas or spaces.
  */
 function addUser() {
     const form = document.getElementById('invite-users-form');
     const form_data = new FormData(form);
+    const usernames = form.new_user.value.split(/[\s,]+/).filter(username => username !== "");
 
-    fetch(`/page/${page_id}/invite-user/request`, {
+    form_data.delete('new_user');
+    usernames.forEach((username, i) => form_data.append(`new_users-${i}`, username));
+
+    showRejectedUsers([]);
+
+    fetch(`/page/${page_id}/invite-users/request`, {
         method: 'POST',
         body: form_data
     })
     .then(response => response.json())
-    .then(addUserSubmit)
+    .then(data => addUserSubmit(data, usernames))
     .catch(error => console.error('Error:', error));
 }
 
 /**
- * Sends an invitation with the encrypted page key, encrypted with the invited user's public key.
+ * Sends the invitations with the encrypted page key, encrypted with each invited user's public key.
  * @param data
+ * @param usernames the usernames the user asked to invite
  */
-async function addUserSubmit(data) {
+async function addUserSubmit(data, usernames) {
+    // Tell the user which usernames do not exist or are already members or invited, the others are still invited.
+    // Usernames past the server's batch size are not invited either
+    if ('rejected' in data) {
+        const invited = new Set((data['invite_public_keys'] || []).map(invited_user => invited_user['username']));
+        showRejectedUsers([...new Set(usernames)].filter(username => !invited.has(username)));
+    }
+
     // If the request was not successful, exit method
     if (!data['success']) {
         if (data['flash']) {
@@ -84,23 +160,23 @@ async function addUserSubmit(data) {
 
     // Get the keys
     let keys = await getKeys(data['browser_key'], data['encrypted_page_key'], "aes");
-    let public_key = await pemToCryptoKey(data['invite_public_key'], "public");
+    let page_key_string = await aesKeyToString(keys['decrypted_key']);
 
-    // Encrypt the key
-    let encrypted_page_key = await encryptWithRSA(public_key, await aesKeyToString(keys['decrypted_key']));
-
-    // Add the data to the form
+    // Encrypt the key for every invited user
     const form = document.getElementById('invite-users-form');
-    let encrypted_key = document.createElement('input');
-    encrypted_key.name = 'encrypted_key';
-    encrypted_key.type = 'hidden';
-    encrypted_key.value = encrypted_page_key;
-    form.appendChild(encrypted_key);
-
-    // Submit the form
     const form_data = new FormData(form);
+    form_data.delete('new_user');
+
+    for (let i = 0; i < data['invite_public_keys'].length; i++) {
+        let invited_user = data['invite_public_keys'][i];
+        let public_key = await pemToCryptoKey(invited_user['key'], "public");
 
-    fetch(`/page/${page_id}/invite-user`, {
+        form_data.append(`encrypted_keys-${i}-username`, invited_user['username']);
+        form_data.append(`encrypted_keys-${i}-key`, await encryptWithRSA(public_key, page_key_string));
+    }
+
+    // Submit the invitations
+    fetch(`/page/${page_id}/invite-users`, {
         method: 'POST',
         body: form_data
     })
@@ -111,9 +187,18 @@ async function addUserSubmit(data) {
     //Clear the data
     data = "";
     keys = "";
-    encrypted_page_key = "";
+    page_key_string = "";
     form.new_user.value = "";
-    form.encrypted_key.value = "";
+}
+
+/**
+ * Shows the usernames that could not be invited below the invite form, or hides the message if there are none.
+ * @param usernames the rejected usernames
+ */
+function showRejectedUsers(usernames) {
+    const message = document.getElementById('invite-users-rejected');
+    message.textContent = `Could not invite: ${usernames.join(', ')}`;
+    message.hidden = usernames.length === 0;
 }
 
 async function deletePost(event) {
@@ -166,7 +251,7 @@ async function updateScreen(data) {
     // If there is new post data, update post data in screen
     if ('posts' in data) {
         // Retrieve the keys
-        let keys = await getKeys(data['browser_key'], data['page_key'], "aes");
+        let keys = await getKeys(encrypted_keys['browser_key'], encrypted_keys['page_key'], "aes");
         let page_key = keys['decrypted_key'];
 
         // Decrypt title
@@ -179,10 +264,6 @@ async function updateScreen(data) {
 
         updateTitle(title, description);
 
-        // Clear the containers
-        document.getElementById('post-add-form').encrypted_message.value = "";
-        document.getElementById('invite-users-form').new_user.value = "";
-
         // Get the posts container
         const postsContainer = document.getElementById('posts');
 
@@ -195,7 +276,16 @@ async function updateScreen(data) {
 
             await addPostToContainer(page_key, postsContainer, post);
         }
+
+        updateLoadOlderButton(data['has_more']);
+        page_version = data['version'];
     }
+
+    // If there are post changes, apply them to the screen
+    if ('new_posts' in data || 'deleted_posts' in data) {
+        await applyWriteChanges(data);
+    }
+
     // Add 'show' class to posts after they are appended
     const posts = document.querySelectorAll('.post');
     posts.forEach(post => post.classList.add('show'));
@@ -208,6 +298,174 @@ async function updateScreen(data) {
     page_key = "";
 }
 
+/**
+ * Applies the changes returned by adding or deleting a post. Syncs with the server instead
+ * if other changes happened since the last known page version.
+ * @param data the changes data
+ */
+async function applyWriteChanges(data) {
+    // Ignore changes that are already on screen
+    if (page_version !== null && data['version'] <= page_version) {
+        return;
+    }
+
+    if (page_version === null || data['version'] !== page_version + 1) {
+        syncPosts();
+        return;
+    }
+
+    await applyPostChanges(data);
+}
+
+/**
+ * Requests all the post changes since the last known page version.
+ */
+function syncPosts() {
+    if (page_version === null) {
+        return;
+    }
+
+    fetch(`/page/${page_id}/changes?since=${page_version}`)
+    .then(response => response.json())
+    .then(syncScreen)
+    .catch(error => console.error('Error:', error));
+}
+
+/**
+ * Updates the screen with the synced changes, reloading all the posts if the client is too far behind.
+ * @param data the changes data
+ */
+async function syncScreen(data) {
+    if (!data['success']) {
+        return;
+    }
+
+    if (data['reset']) {
+        fetch(`/page/${page_id}/init-get`)
+        .then(response => response.json())
+        .then(updateScreen)
+        .catch(error => console.error('Error:', error));
+        return;
+    }
+
+    await applyPostChanges(data);
+}
+
+/**
+ * Adds the new posts and removes the deleted posts from the screen.
+ * @param data the changes data
+ */
+async function applyPostChanges(data) {
+    const postsContainer = document.getElementById('posts');
+
+    // Remove the deleted posts
+    const deleted_posts = data['deleted_posts'] || [];
+    for (let i = 0; i < deleted_posts.length; i++) {
+        const post = findPost(deleted_posts[i]);
+        if (post != null) {
+            post.remove();
+        }
+    }
+
+    // Add the new posts that are not already on screen
+    const new_posts = (data['new_posts'] || []).filter(post => findPost(post.id) == null);
+    if (new_posts.length > 0) {
+        // Check if sessionStorage contains the encrypted user key
+        if (sessionStorage.getItem('key') == null) {
+            // Log out user if not
+            window.location.href = '/logout';
+        }
+
+        let keys = await getKeys(encrypted_keys['browser_key'], encrypted_keys['page_key'], "aes");
+        let page_key = keys['decrypted_key'];
+
+        for (let i = 0; i < new_posts.length; i++) {
+            await addPostToContainer(page_key, postsContainer, new_posts[i]);
+        }
+
+        // Clear sensitive data
+        keys = "";
+        page_key = "";
+    }
+
+    page_version = data['version'];
+}
+
+/**
+ * Finds the post element with a given post id
+ * @param post_id the id of the post
+ * @returns the post element, or null if it is not on screen
+ */
+function findPost(post_id) {
+    const post_ids = document.querySelectorAll('#posts .post-id');
+    for (let i = 0; i < post_ids.length; i++) {
+        if (post_ids[i].value === String(post_id)) {
+            return post_ids[i].closest('.post');
+        }
+    }
+    return null;
+}
+
+/**
+ * Loads the page of posts older than the oldest post currently on screen.
+ */
+function loadOlderPosts() {
+    const oldest_post = document.querySelector('#posts .post-id');
+    if (oldest_post == null) {
+        return;
+    }
+
+    fetch(`/page/${page_id}/posts?before=${oldest_post.value}`)
+    .then(response => response.json())
+    .then(addOlderPosts)
+    .catch(error => console.error('Error:', error));
+}
+
+/**
+ * Adds older posts to the top of the posts container
+ * @param data the older posts data
+ */
+async function addOlderPosts(data) {
+    if (!data['success']) {
+        return;
+    }
+
+    // Check if sessionStorage contains the encrypted user key
+    if (sessionStorage.getItem('key') == null) {
+        // Log out user if not
+        window.location.href = '/logout';
+    }
+
+    // Retrieve the keys
+    let keys = await getKeys(encrypted_keys['browser_key'], encrypted_keys['page_key'], "aes");
+    let page_key = keys['decrypted_key'];
+
+    // Build the older posts separately and insert them above the current posts
+    const olderPosts = document.createDocumentFragment();
+    for (let i = 0; i < data['posts'].length; i++) {
+        await addPostToContainer(page_key, olderPosts, data['posts'][i]);
+    }
+    olderPosts.querySelectorAll('.post').forEach(post => post.classList.add('show'));
+
+    const postsContainer = document.getElementById('posts');
+    postsContainer.insertBefore(olderPosts, postsContainer.firstChild);
+
+    updateLoadOlderButton(data['has_more']);
+
+    // Clear sensitive data
+    data = "";
+    keys = "";
+    page_key = "";
+}
+
+/**
+ * Shows the load older posts button only if there are older posts
+ * @param has_more whether there are older posts
+ */
+function updateLoadOlderButton(has_more) {
+    document.getElementById('load-older-posts').hidden = !has_more;
+}
+
 /**
  * Adds a post to the posts container
  * @param page_key decryption key to access post content
@@ -62,6 +62,16 @@ async function updateScreen(data) {
         }
     }
 
+    // Remove the accepted or declined invite from the screen
+    if ('removed_invite' in data) {
+        const rows = document.querySelectorAll('#invites-tbody tr');
+        for (let i = 0; i < rows.length; i++) {
+            if (rows[i].querySelector('td').textContent === String(data['removed_invite'])) {
+                rows[i].remove();
+            }
+        }
+    }
+
     // Update invites if contained in data
     if ('invites' in data) {
         // Check if sessionStorage contains the encrypted user key
@@ -75,7 +85,11 @@ async function updateScreen(data) {
         let private_key = keys['decrypted_key'];
 
         const tbody = document.getElementById('invites-tbody');
-        tbody.innerHTML = ''; // Clear existing content
+
+        // Clear existing content, unless more invites were loaded
+        if (!data['append']) {
+            tbody.innerHTML = '';
+        }
 
         // Add each invite to the page
         for (let i = 0; i < data['invites'].length; i++) {
@@ -95,7 +109,28 @@ async function updateScreen(data) {
             // Add the invite to the page
             addInviteToPage(tbody, invite, title, encrypted_page_key);
         }
+
+        document.getElementById('load-more-invites').hidden = !data['has_more'];
+    }
+}
+
+/**
+ * Loads the invites after the last invite on screen.
+ */
+function loadMoreInvites() {
+    const rows = document.querySelectorAll('#invites-tbody tr');
+    if (rows.length === 0) {
+        return;
     }
+    const last_invite_id = rows[rows.length - 1].querySelector('td').textContent;
+
+    fetch(`/pages/invites/init-get?after=${last_invite_id}`)
+        .then(response => response.json())
+        .then(data => {
+            data['append'] = true;
+            return updateScreen(data);
+        })
+        .catch(error => console.error('Error:', error));
 }
 
 /**
@@ -24,6 +24,16 @@ async function updateScreen(data) {
         }
     }
 
+    // Remove the deleted page from the screen
+    if ('deleted_page' in data) {
+        const rows = document.querySelectorAll('#pages-tbody tr');
+        for (let i = 0; i < rows.length; i++) {
+            if (rows[i].querySelector('td').textContent === String(data['deleted_page'])) {
+                rows[i].remove();
+            }
+        }
+    }
+
     // If request has page data, update pages
     if ('pages' in data) {
         const browser_key = await stringToAesKey(data['browser_key']);
@@ -34,7 +44,11 @@ async function updateScreen(data) {
         user_key = await stringToAesKey(user_key);
 
         let tbody = document.getElementById('pages-tbody');
-        tbody.innerHTML = ''; // Clear existing content
+
+        // Clear existing content, unless more pages were loaded
+        if (!data['append']) {
+            tbody.innerHTML = '';
+        }
 
         // Go through each page and decrypt the titles and show it on screen
         for (let i = 0; i < data['pages'].length; i++) {
@@ -52,12 +66,33 @@ async function updateScreen(data) {
             addPage(tbody, page['id'], page_title);
         }
 
+        document.getElementById('load-more-pages').hidden = !data['has_more'];
+
         // Clear the sensitive data from memory
         user_key = "";
         data = "";
     }
 }
 
+/**
+ * Loads the pages after the last page on screen.
+ */
+function loadMorePages() {
+    const rows = document.querySelectorAll('#pages-tbody tr');
+    if (rows.length === 0) {
+        return;
+    }
+    const last_page_id = rows[rows.length - 1].querySelector('td').textContent;
+
+    fetch(`/pages/init-get?after=${last_page_id}`)
+        .then(response => response.json())
+        .then(data => {
+            data['append'] = true;
+            return updateScreen(data);
+        })
+        .catch(error => console.error('Error:', error));
+}
+
 /**
  * Adds page to the screen
  * @param tbody the body the information is added to
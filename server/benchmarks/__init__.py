@@ -0,0 +1,8 @@
+"""
+Benchmarks of the server. Run from the server directory, for example:
+
+    python -m benchmarks.routes --users 200 --pages 50 --posts-per-page 500
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
@@ -0,0 +1,190 @@
+"""
+Microbenchmarks of the cryptographic functions in app/crypto.py. Measures the operations per second and the
+peak memory allocated by each function, sweeping message sizes from a timestamp to 64 KB, with warm keys that
+are cached by get_aes_key and cold keys that are not, and with single calls against batched calls.
+
+Run from the server directory:
+
+    python -m benchmarks.crypto --output crypto.json --save-baseline crypto_baseline.json
+    python -m benchmarks.crypto --baseline crypto_baseline.json
+
+With --baseline, exits with status 1 if any case's throughput is lower than the baseline by more than the
+tolerance. Baselines depend on the machine, so compare runs of the same machine.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from app.crypto import aes_encrypt, aes_decrypt, aes_encrypt_many, aes_decrypt_many, aes_key_to_string, \
+    generate_aes_key, generate_salt
+
+# Message sizes in bytes, from an encrypted post timestamp to a large message
+MESSAGE_SIZES = (26, 256, 1024, 4096, 16384, 65536)
+
+# Messages per batched call
+BATCH_SIZE = 100
+
+# More keys than get_aes_key caches, so cycling through them never hits the cache
+_COLD_KEY_COUNT = 64
+
+
+def _cases():
+    """
+    Creates the benchmark cases.
+    :return: list of (name, operations per call, function) tuples
+    """
+    warm_key = aes_key_to_string(generate_aes_key())
+    cold_keys = [aes_key_to_string(generate_aes_key()) for _ in range(_COLD_KEY_COUNT)]
+    cold_index = [0]
+
+    def cold_key():
+        cold_index[0] = (cold_index[0] + 1) % _COLD_KEY_COUNT
+        return cold_keys[cold_index[0]]
+
+    cases = [
+        ("generate_salt", 1, generate_salt),
+        ("generate_aes_key", 1, generate_aes_key),
+    ]
+
+    for size in MESSAGE_SIZES:
+        message = "x" * size
+        encrypted = aes_encrypt(message, warm_key)
+        encrypted_cold = {key: aes_encrypt(message, key) for key in cold_keys}
+        messages = [message] * BATCH_SIZE
+        encrypted_messages = [encrypted] * BATCH_SIZE
+
+        cases += [
+            ("aes_encrypt/warm/%d" % size, 1, lambda message=message: aes_encrypt(message, warm_key)),
+            ("aes_encrypt/cold/%d" % size, 1, lambda message=message: aes_encrypt(message, cold_key())),
+            ("aes_decrypt/warm/%d" % size, 1, lambda encrypted=encrypted: aes_decrypt(encrypted, warm_key)),
+            ("aes_decrypt/cold/%d" % size, 1, lambda encrypted_cold=encrypted_cold: _decrypt_cold(encrypted_cold, cold_key())),
+            ("aes_encrypt/single/%d" % size, BATCH_SIZE, lambda messages=messages: [aes_encrypt(message, warm_key) for message in messages]),
+            ("aes_encrypt_many/batched/%d" % size, BATCH_SIZE, lambda messages=messages: aes_encrypt_many(messages, warm_key)),
+            ("aes_decrypt/single/%d" % size, BATCH_SIZE, lambda encrypted_messages=encrypted_messages: [aes_decrypt(encrypted, warm_key) for encrypted in encrypted_messages]),
+            ("aes_decrypt_many/batched/%d" % size, BATCH_SIZE, lambda encrypted_messages=encrypted_messages: aes_decrypt_many(encrypted_messages, warm_key)),
+        ]
+
+    return cases
+
+
+def _decrypt_cold(encrypted_by_key, key):
+    return aes_decrypt(encrypted_by_key[key], key)
+
+
+def measure(function, operations, min_time=0.2, repeat=3):
+    """
+    Measures the throughput and peak allocation of a function.
+    :param function: the function to call
+    :param operations: number of operations done by each call
+    :param min_time: minimum seconds of every timed run
+    :param repeat: number of timed runs, the fastest is kept
+    :return: operations per second and peak bytes allocated by one call
+    """
+    # Find how many calls take at least the minimum time
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+
+    # Allocations are measured separately, since tracing slows the calls down
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        function()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return calls * operations / best, peak
+
+
+def run(min_time=0.2, repeat=3, selected=None):
+    """
+    Runs the benchmark cases.
+    :param min_time: minimum seconds of every timed run
+    :param repeat: number of timed runs of each case
+    :param selected: optional substrings of the names of the cases to run
+    :return: dictionary of the results by case name
+    """
+    results = {}
+    for name, operations, function in _cases():
+        if selected and not any(part in name for part in selected):
+            continue
+
+        ops_per_second, peak = measure(function, operations, min_time, repeat)
+        results[name] = {"ops_per_second": round(ops_per_second, 1), "peak_alloc_bytes": peak}
+        print("%-36s %14.1f ops/s %12d bytes" % (name, ops_per_second, peak))
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Finds the cases whose throughput regressed past the baseline.
+    :param results: the results of this run
+    :param baseline: the baseline results
+    :param tolerance: allowed fraction of throughput lost
+    :return: list of regression descriptions
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        expected = baseline[name]["ops_per_second"]
+        if result["ops_per_second"] < expected * (1 - tolerance):
+            regressions.append("%s: %.1f ops/s, baseline %.1f ops/s" % (name, result["ops_per_second"], expected))
+
+    return regressions
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the cryptographic functions.")
+    parser.add_argument('--min-time', type=float, default=0.2, help="minimum seconds of every timed run")
+    parser.add_argument('--repeat', type=int, default=3, help="number of timed runs of each case")
+    parser.add_argument('--cases', nargs='+', default=None, help="only run the cases whose names contain one of these")
+    parser.add_argument('--output', default=None, help="file the JSON results are written to")
+    parser.add_argument('--baseline', default=None, help="JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed fraction of throughput lost against the baseline")
+    parser.add_argument('--save-baseline', default=None, help="file the results are saved to as a new baseline")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = _parse_args()
+    benchmark_results = run(arguments.min_time, arguments.repeat, arguments.cases)
+
+    for path in (arguments.output, arguments.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(benchmark_results, file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline, 'r') as file:
+            found_regressions = compare(benchmark_results, json.load(file), arguments.tolerance)
+
+        if found_regressions:
+            print("\nThroughput regressed past the baseline:")
+            for regression in found_regressions:
+                print("  " + regression)
+            sys.exit(1)
+
+        print("\nNo regressions against %s" % arguments.baseline)
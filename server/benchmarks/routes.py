@@ -0,0 +1,308 @@
+"""
+Route level benchmark. Seeds a fresh database with synthetic data, then drives the real routes from concurrent
+workers, either through Flask's test client or through a local WSGI server, and reports the latency percentiles,
+throughput, SQL query count and payload size of every route. The results are written as JSON so runs can be
+compared.
+
+Run from the server directory, with the configuration set up by initialize.py:
+
+    python -m benchmarks.routes --users 200 --pages 50 --posts-per-page 500 --workers 8 --output results.json
+
+By default the data is seeded into a temporary SQLite database, the configured database is never used.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+from sqlalchemy import event
+from werkzeug.serving import make_server
+from app import create_app, db
+from benchmarks.seed import seed, PASSWORD
+
+# Response header carrying the number of SQL statements a request ran
+QUERY_COUNT_HEADER = 'X-Benchmark-Queries'
+
+
+def _login(worker):
+    return "POST", "/login/submit", {"email": worker.email, "hashed_password": PASSWORD}
+
+
+def _pages_init_get(worker):
+    return "GET", "/pages/init-get", None
+
+
+def _page_init_get(worker):
+    return "GET", "/page/%d/init-get" % worker.random_page(), None
+
+
+def _page_invites_init_get(worker):
+    return "GET", "/pages/invites/init-get", None
+
+
+def _add_post(worker):
+    message = worker.rng.randbytes(16).hex() + ":" + worker.rng.randbytes(208).hex()
+    return "POST", "/page/%d/add-post" % worker.random_page(), {"encrypted_message": message}
+
+
+# Benchmarked routes, each creating the method, path and form data of a request for a worker
+ROUTES = {
+    "login": _login,
+    "pages_init_get": _pages_init_get,
+    "page_init_get": _page_init_get,
+    "page_invites_init_get": _page_invites_init_get,
+    "add_post": _add_post,
+}
+
+
+class TestClientTransport:
+    """
+    Sends requests through Flask's test client, in the calling thread.
+    """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        return response.status_code, response.get_data(), int(response.headers.get(QUERY_COUNT_HEADER, 0))
+
+
+class HTTPTransport:
+    """
+    Sends requests to a WSGI server over HTTP, keeping the session cookie.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, data=None, headers=None):
+        body = urlencode(data).encode('utf-8') if data is not None else None
+        request = Request(self.base_url + path, data=body, method=method, headers=headers or {})
+
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read(), int(response.headers.get(QUERY_COUNT_HEADER, 0))
+        except HTTPError as error:
+            return error.code, error.read(), int(error.headers.get(QUERY_COUNT_HEADER, 0))
+
+
+class Worker:
+    """
+    A logged in user sending benchmark requests.
+    """
+
+    def __init__(self, transport, username, email, pages, headers, random_seed):
+        self.transport = transport
+        self.username = username
+        self.email = email
+        self.pages = pages
+        self.headers = headers
+        self.rng = random.Random(random_seed)
+
+    def random_page(self):
+        return self.rng.choice(self.pages)
+
+    def send(self, route):
+        """
+        Sends one request to a route.
+        :param route: the function creating the request
+        :return: latency in seconds, status code, payload bytes and SQL query count
+        """
+        method, path, data = route(self)
+        start = time.perf_counter()
+        status, body, queries = self.transport.request(method, path, data, self.headers)
+        return time.perf_counter() - start, status, len(body), queries
+
+
+def run(args):
+    """
+    Seeds the database, runs every route and returns the results.
+    :param args: the parsed command line arguments
+    :return: json serializable results
+    """
+    directory = tempfile.mkdtemp(prefix='benchmark-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database_uri or 'sqlite:///' + os.path.join(directory, 'benchmark.sqlite'),
+        'SQLALCHEMY_BINDS': {},
+        'DATABASE_REPLICAS': [],
+        'SESSION_SQLITE_PATH': os.path.join(directory, 'sessions.sqlite'),
+        'SESSION_FILE_DIR': os.path.join(directory, 'sessions'),
+        'EVENTS_BROKER': 'local',
+        'WTF_CSRF_ENABLED': False,
+    })
+    _count_queries(app)
+
+    print("Seeding database")
+    start = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        data = seed(users=args.users, pages=args.pages, members_per_page=args.members_per_page, posts_per_page=args.posts_per_page,
+                    invites_per_user=args.invites_per_user, message_size=args.message_size, random_seed=args.seed)
+    seed_seconds = time.perf_counter() - start
+
+    server = None
+    if args.server:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        new_transport = lambda: HTTPTransport("http://127.0.0.1:%d" % server.server_port)
+    else:
+        new_transport = lambda: TestClientTransport(app)
+
+    try:
+        workers = _create_workers(data, new_transport, args)
+
+        results = {}
+        for name in args.routes:
+            print("Benchmarking %s" % name)
+            results[name] = _run_route(ROUTES[name], workers, args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    return {
+        "settings": {key: value for key, value in vars(args).items() if key != 'output'},
+        "seed_seconds": round(seed_seconds, 3),
+        "routes": results,
+    }
+
+
+def _count_queries(app):
+    """
+    Adds the number of SQL statements run by each request to its response.
+    :param app: the application
+    :return:
+    """
+    counter = threading.local()
+
+    def count(*args):
+        counter.queries = getattr(counter, 'queries', 0) + 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', count)
+
+    @app.before_request
+    def reset_count():
+        counter.queries = 0
+
+    @app.after_request
+    def add_count(response):
+        response.headers[QUERY_COUNT_HEADER] = str(getattr(counter, 'queries', 0))
+        return response
+
+
+def _create_workers(data, new_transport, args):
+    """
+    Logs in one worker for each concurrent client, as users that are members of at least one page.
+    """
+    rng = random.Random(args.seed)
+    members = [username for username in data["usernames"] if data["user_pages"][username]]
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+
+    workers = []
+    for i, username in enumerate(rng.sample(members, min(args.workers, len(members)))):
+        email = data["emails"][data["usernames"].index(username)]
+        worker = Worker(new_transport(), username, email, data["user_pages"][username], headers, args.seed + i)
+
+        status = worker.send(_login)[1]
+        if status != 200:
+            raise RuntimeError("Could not log in %s, status %d" % (username, status))
+        workers.append(worker)
+
+    return workers
+
+
+def _run_route(route, workers, requests):
+    """
+    Sends requests to a route from all the workers at once.
+    :param route: the function creating the route's requests
+    :param workers: the logged in workers
+    :param requests: total number of requests to send
+    :return: the route's statistics
+    """
+    def work(worker, count):
+        return [worker.send(route) for _ in range(count)]
+
+    counts = [requests // len(workers) + (1 if i < requests % len(workers) else 0) for i in range(len(workers))]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        samples = [sample for samples in executor.map(work, workers, counts) for sample in samples]
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample[1] >= 400),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "sql_queries": _summary([sample[3] for sample in samples]),
+        "payload_bytes": _summary([sample[2] for sample in samples]),
+    }
+
+
+def _percentile(sorted_values, percent):
+    # Nearest rank percentile
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def _summary(values):
+    return {"mean": round(sum(values) / len(values), 2), "max": max(values)}
+
+
+def _print_results(results):
+    print()
+    print("%-24s %10s %10s %10s %10s %8s %10s" % ("route", "req/s", "p50 ms", "p95 ms", "p99 ms", "queries", "bytes"))
+    for name, result in results["routes"].items():
+        latency = result["latency_ms"]
+        print("%-24s %10.1f %10.2f %10.2f %10.2f %8.1f %10.0f" % (name, result["throughput_rps"], latency["p50"], latency["p95"], latency["p99"],
+                                                               result["sql_queries"]["mean"], result["payload_bytes"]["mean"]))
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the server's routes against generated data.")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--members-per-page', type=int, default=5)
+    parser.add_argument('--posts-per-page', type=int, default=200)
+    parser.add_argument('--invites-per-user', type=int, default=2)
+    parser.add_argument('--message-size', type=int, default=200, help="average post size in bytes before encryption")
+    parser.add_argument('--workers', type=int, default=4, help="number of concurrent clients")
+    parser.add_argument('--requests', type=int, default=200, help="number of requests per route")
+    parser.add_argument('--routes', nargs='+', choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument('--server', action='store_true', help="send requests over HTTP to a local WSGI server instead of the test client")
+    parser.add_argument('--accept-encoding', default=None, help="Accept-Encoding header of the requests, such as gzip")
+    parser.add_argument('--database-uri', default=None, help="empty database to seed instead of a temporary SQLite database")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated data")
+    parser.add_argument('--output', default='route_benchmark.json', help="file the JSON results are written to")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = _parse_args()
+    benchmark_results = run(arguments)
+    _print_results(benchmark_results)
+
+    with open(arguments.output, 'w') as file:
+        json.dump(benchmark_results, file, indent=2)
+    print("\nResults written to %s" % arguments.output)
@@ -0,0 +1,116 @@
+"""
+Synthetic data generator for benchmarks. Fills a database with users, pages, members, posts and invites whose
+ciphertext has the same sizes as the ciphertext written by real browsers.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import base64
+import hashlib
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import db
+from app.crypto import aes_encrypt, aes_encrypt_many, aes_key_to_string, generate_aes_key, generate_salt
+from app.models import User, Page, UserAccess, Invite, Post
+from config import database_key
+
+# Password of every generated user
+PASSWORD = "benchmark"
+
+# Rows inserted per statement
+_BATCH_SIZE = 1000
+
+
+def seed(users=100, pages=20, members_per_page=5, posts_per_page=200, invites_per_user=2, message_size=200, random_seed=0):
+    """
+    Fills the database of the current application context with generated data.
+
+    :param users: number of users
+    :param pages: number of pages
+    :param members_per_page: number of users with access to each page
+    :param posts_per_page: number of posts on each page
+    :param invites_per_user: number of pending invites of each user
+    :param message_size: average size of a post's message before encryption, in bytes
+    :param random_seed: seed of the generated data
+    :return: dictionary with the generated usernames, emails and the ids of each user's pages
+    """
+    rng = random.Random(random_seed)
+    members_per_page = min(members_per_page, users)
+
+    # Hashing is slow, so every user shares the same password hash
+    password_hash = generate_password_hash(PASSWORD)
+
+    usernames = ["user%d" % i for i in range(users)]
+    emails = ["%s@example.com" % username for username in usernames]
+    _insert(User, [{
+        "username": username,
+        "encrypted_email": aes_encrypt(email, database_key),
+        "email_hash": hashlib.sha256(email.encode('utf-8')).hexdigest(),
+        "password_hash": password_hash,
+        "public_key": _public_key(rng),
+        "encrypted_private_key": _browser_ciphertext(rng, 1704),
+        "aes_salt": generate_salt(),
+        "browser_encryption_key": aes_key_to_string(generate_aes_key()),
+    } for username, email in zip(usernames, emails)])
+    user_ids = dict(db.session.query(User.username, User.id).all())
+
+    _insert(Page, [{"encrypted_title": _browser_ciphertext(rng, 24), "encrypted_description": _browser_ciphertext(rng, 200)} for _ in range(pages)])
+    page_ids = [page_id for page_id, in db.session.query(Page.id).order_by(Page.id).all()]
+
+    # Give every page its members, and every user a few invites to pages they are not in
+    members = {page_id: rng.sample(usernames, members_per_page) for page_id in page_ids}
+    user_pages = {username: [] for username in usernames}
+    access_rows = []
+    for page_id, page_members in members.items():
+        for username in page_members:
+            user_pages[username].append(page_id)
+            access_rows.append({"page_id": page_id, "user_id": user_ids[username], "encrypted_key": _browser_ciphertext(rng, 44)})
+    _insert(UserAccess, access_rows)
+
+    invite_rows = []
+    for username in usernames:
+        candidates = [page_id for page_id in page_ids if username not in members[page_id]]
+        for page_id in rng.sample(candidates, min(invites_per_user, len(candidates))):
+            invite_rows.append({"page_id": page_id, "user_id": user_ids[username], "encrypted_key": _rsa_ciphertext(rng)})
+    _insert(Invite, invite_rows)
+
+    # Posts, with the server encrypted timestamps of real posts
+    start = datetime.now() - timedelta(days=30)
+    for page_id in page_ids:
+        timestamps = [str(start + timedelta(seconds=i * 60)) for i in range(posts_per_page)]
+        encrypted_timestamps = aes_encrypt_many(timestamps, database_key)
+        _insert(Post, [{
+            "encrypted_message": _browser_ciphertext(rng, max(1, int(rng.gauss(message_size, message_size / 4)))),
+            "created_at": encrypted_timestamp,
+            "user_id": user_ids[rng.choice(members[page_id])],
+            "page_id": page_id,
+        } for encrypted_timestamp in encrypted_timestamps])
+
+    db.session.commit()
+
+    return {"usernames": usernames, "emails": emails, "user_pages": user_pages}
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), _BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + _BATCH_SIZE])
+
+
+def _browser_ciphertext(rng, size):
+    # AES-CBC ciphertext written by the browser, "iv:ciphertext" in hex with a 16 byte iv and padding
+    return rng.randbytes(16).hex() + ":" + rng.randbytes((size // 16 + 1) * 16).hex()
+
+
+def _rsa_ciphertext(rng):
+    # A page key encrypted with a 2048 bit RSA public key
+    return base64.b64encode(rng.randbytes(256)).decode('ascii')
+
+
+def _public_key(rng):
+    # PEM encoded 2048 bit RSA public key
+    body = base64.b64encode(rng.randbytes(294)).decode('ascii')
+    lines = [body[i:i + 64] for i in range(0, len(body), 64)]
+    return "-----BEGIN PUBLIC KEY-----\n" + "\n".join(lines) + "\n-----END PUBLIC KEY-----"
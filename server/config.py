@@ -8,7 +8,8 @@ Config file for the server. Loads data from an encrypted file.
 import os
 import json
 import getpass
-from app.crypto import aes_decrypt
+from app.crypto import AESKey
+from app.database import is_sqlite_uri
 
 
 def _decrypt_config():
@@ -19,15 +20,16 @@ def _decrypt_config():
     # Retrieve the encryption key
     encryption_key = getpass.getpass("Please enter generated encryption key (The key you were asked to remember): ")
 
-    # Decrypt the data
+    # Decrypt the data, the tests point ENV_FILE to a throwaway configuration
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, 'app', 'secrets', 'env.json.enc')
+    file_path = os.environ.get('ENV_FILE', os.path.join(base_dir, 'app', 'secrets', 'env.json.enc'))
 
     with open(file_path, 'r') as file:
         encrypted_data = file.read()
 
     try:
-        decrypted_data = aes_decrypt(encrypted_data, encryption_key).replace('\'', '\"')
+        # Not cached like the keys of aes_decrypt, so the master key is not kept in memory after use
+        decrypted_data = AESKey(encryption_key).decrypt(encrypted_data).replace('\'', '\"')
         config_data = json.loads(decrypted_data)
     except json.JSONDecodeError:
         print("Error: Incorrect encryption key")
@@ -45,6 +47,83 @@ database_key = _config_data['database_key']
 
 class Config:
     SECRET_KEY = _config_data['secret_key']
-    SQLALCHEMY_DATABASE_URI = _config_data['mysql_uri']
+    # Installations set up before SQLite support store the URI as mysql_uri
+    SQLALCHEMY_DATABASE_URI = _config_data.get('database_uri', _config_data.get('mysql_uri'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool of every database engine
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': _config_data.get('pool_size', 10),
+        'max_overflow': _config_data.get('pool_max_overflow', 20),
+        'pool_recycle': _config_data.get('pool_recycle', 3600),
+        'pool_pre_ping': _config_data.get('pool_pre_ping', True),
+    }
+    if is_sqlite_uri(SQLALCHEMY_DATABASE_URI):
+        # SQLite connections are local and cheap, and in-memory databases do not accept pool sizes
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    # Pragmas set on every SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,
+        'cache_size': -65536,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        **_config_data.get('sqlite_pragmas', {}),
+    }
+    # Optional read replicas, used by the GET requests of users that have not written recently
+    SQLALCHEMY_BINDS = {'replica_%d' % i: uri for i, uri in enumerate(_config_data.get('replica_uris', []))}
+    DATABASE_REPLICAS = list(SQLALCHEMY_BINDS)
+    DATABASE_REPLICA_STICKY_SECONDS = 10
     SESSION_PERMANENT = False
+    # Either "sqlite", "file", "redis" or "cookie", sessions are shared between worker processes except with "cookie"
+    SESSION_BACKEND = _config_data.get('session_backend', 'sqlite')
+    SESSION_SQLITE_PATH = _config_data.get('session_sqlite_path', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions.sqlite'))
+    SESSION_FILE_DIR = _config_data.get('session_file_dir', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions'))
+    SESSION_REDIS_URL = _config_data.get('session_redis_url', 'redis://localhost:6379/0')
+    SESSION_LIFETIME = 86400
+    SESSION_SWEEP_INTERVAL = 300
+    POSTS_PAGE_SIZE = 50
+    PAGES_PAGE_SIZE = 50
+    INVITES_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    # Page versions the tombstones of deleted posts are kept for, clients further behind reload the page
+    TOMBSTONE_RETENTION = 1000
+    INVITE_BATCH_SIZE = 50
+    TIMESTAMP_CACHE_SIZE = 100000
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = 60
+    PUBLIC_KEY_CACHE_SIZE = 10000
+    PUBLIC_KEY_MAX_AGE = 86400
+    # Pages with more posts than the threshold are deleted by a background worker
+    PAGE_DELETE_BATCH_SIZE = 1000
+    PAGE_DELETE_BACKGROUND_THRESHOLD = 5000
+    BACKGROUND_WORKERS = 1
+    # Compression of the JSON responses of each blueprint's compressible views, zstd and brotli need the zstandard and brotli packages
+    COMPRESS_BLUEPRINTS = {'page': {}, 'account': {}}
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_ALGORITHMS = ('zstd', 'br', 'gzip')
+    # Either "text" or "binary", run convert_ciphertext.py before switching an existing database to binary
+    CIPHERTEXT_STORAGE = _config_data.get('ciphertext_storage', 'text')
+    # Live page events, use the sqlite broker when running multiple worker processes
+    EVENTS_BROKER = _config_data.get('events_broker', 'local')
+    EVENTS_SQLITE_PATH = _config_data.get('events_sqlite_path', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'events.sqlite'))
+    EVENTS_KEEPALIVE = 15
+    EVENTS_STREAM_TIMEOUT = 300
+    # Prometheus metrics on /metrics, only served with the token to these addresses. /metrics is disabled without a token
+    METRICS_TOKEN = _config_data.get('metrics_token')
+    METRICS_ENABLED = _config_data.get('metrics_enabled', True)
+    METRICS_ALLOWED_ADDRESSES = tuple(_config_data.get('metrics_allowed_addresses', ('127.0.0.1', '::1')))
+    # Warns when a request runs more SQL statements than its budget, routes can override it with max_queries.
+    # Meant for development and staging, with QUERY_BUDGET_RAISE raising instead in test mode
+    QUERY_BUDGET_ENABLED = _config_data.get('query_budget_enabled', False)
+    QUERY_BUDGET = _config_data.get('query_budget', 20)
+    QUERY_BUDGET_RAISE = _config_data.get('query_budget_raise', False)
+    # Sampling profiler writing the stacks of slow requests, toggled per worker on /profiler with the token from
+    # these addresses. /profiler is disabled without a token
+    PROFILER_TOKEN = _config_data.get('profiler_token')
+    PROFILER_ENABLED = _config_data.get('profiler_enabled', False)
+    PROFILER_THRESHOLD = _config_data.get('profiler_threshold', 1.0)
+    PROFILER_SAMPLE_INTERVAL = _config_data.get('profiler_sample_interval', 0.005)
+    PROFILER_CAPTURE_INTERVAL = _config_data.get('profiler_capture_interval', 60)
+    PROFILER_DIR = _config_data.get('profiler_dir', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+    PROFILER_ALLOWED_ADDRESSES = tuple(_config_data.get('profiler_allowed_addresses', ('127.0.0.1', '::1')))
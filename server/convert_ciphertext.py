@@ -0,0 +1,145 @@
+"""
+File used to convert the ciphertext columns of an existing database to compact binary storage.
+Changes the column types to binary and rewrites the rows in batches. Progress is saved after every batch,
+so the conversion can be stopped and resumed at any time.
+
+Run it once, set "ciphertext_storage" to "binary" in the configuration and restart the server, then run it
+again with --restart to convert the rows written in the meantime.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+from app import db, create_app
+from app.ciphertext import Ciphertext, pack, unpack, is_packed
+import app.models
+import json
+import sys
+from sqlalchemy import inspect, text, bindparam, LargeBinary, BINARY, VARBINARY
+
+BATCH_SIZE = 1000
+
+
+def convert(restart=False):
+    """
+    Converts the ciphertext columns of the database of the current application context.
+    :param restart: ignore the saved progress and start over
+    :return:
+    """
+    with db.engine.connect() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS ciphertext_conversion (table_name VARCHAR(64) PRIMARY KEY, last_key VARCHAR(255))"))
+        if restart:
+            connection.execute(text("DELETE FROM ciphertext_conversion"))
+        connection.commit()
+
+        for table in db.metadata.sorted_tables:
+            columns = [column for column in table.columns if isinstance(column.type, Ciphertext)]
+            if columns:
+                _convert_column_types(connection, table, columns)
+                _convert_rows(connection, table, columns)
+
+    print("Conversion successful")
+
+
+def _convert_column_types(connection, table, columns):
+    """
+    Changes the types of the ciphertext columns to binary types. Not needed for SQLite, which stores
+    binary values in any column.
+    :param connection: database connection
+    :param table: the table
+    :param columns: the ciphertext columns of the table
+    :return:
+    """
+    if connection.dialect.name == 'sqlite':
+        return
+
+    quote = connection.dialect.identifier_preparer.quote
+    existing_types = {column['name']: column['type'] for column in inspect(connection).get_columns(table.name)}
+
+    for column in columns:
+        if isinstance(existing_types[column.name], (LargeBinary, BINARY, VARBINARY)):
+            continue
+
+        print(f"Changing {table.name}.{column.name} to binary")
+        column_type = LargeBinary(column.type.length).compile(dialect=connection.dialect)
+        null = "NOT NULL" if not column.nullable else "NULL"
+        connection.execute(text(f"ALTER TABLE {quote(table.name)} MODIFY {quote(column.name)} {column_type} {null}"))
+        connection.commit()
+
+
+def _convert_rows(connection, table, columns):
+    """
+    Rewrites the ciphertext of a table's rows into binary envelopes, walking the table in primary key order.
+    :param connection: database connection
+    :param table: the table
+    :param columns: the ciphertext columns of the table
+    :return:
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    key_names = [column.name for column in table.primary_key.columns]
+    column_names = [column.name for column in columns]
+
+    select_columns = ", ".join(quote(name) for name in key_names + column_names)
+    order = ", ".join(quote(name) for name in key_names)
+    key_match = " AND ".join(f"{quote(name)} = :key_{i}" for i, name in enumerate(key_names))
+
+    last_key = _load_progress(connection, table.name)
+    converted = 0
+
+    while True:
+        after = "" if last_key is None else "WHERE " + _after_key_condition(quote, key_names)
+        parameters = {} if last_key is None else {f"key_{i}": value for i, value in enumerate(last_key)}
+        rows = connection.execute(text(f"SELECT {select_columns} FROM {quote(table.name)} {after} ORDER BY {order} LIMIT {BATCH_SIZE}"), parameters).fetchall()
+        if not rows:
+            break
+
+        for row in rows:
+            key = row[:len(key_names)]
+            values = row[len(key_names):]
+
+            # Only rewrite the values that are still stored as text
+            updates = {name: pack(unpack(value)) for name, value in zip(column_names, values) if value is not None and not is_packed(value)}
+            if not updates:
+                continue
+
+            assignments = ", ".join(f"{quote(name)} = :{name}" for name in updates)
+            statement = text(f"UPDATE {quote(table.name)} SET {assignments} WHERE {key_match}").bindparams(*(bindparam(name, type_=LargeBinary) for name in updates))
+            connection.execute(statement, {**updates, **{f"key_{i}": value for i, value in enumerate(key)}})
+            converted += 1
+
+        last_key = list(rows[-1][:len(key_names)])
+        _save_progress(connection, table.name, last_key)
+        connection.commit()
+
+    print(f"Converted {converted} rows of {table.name}")
+
+
+def _after_key_condition(quote, key_names):
+    """
+    Builds the condition for rows after a primary key, for single and composite keys.
+    :param quote: identifier quoting function
+    :param key_names: names of the primary key columns
+    :return: the SQL condition
+    """
+    conditions = []
+    for i in range(len(key_names)):
+        equal = [f"{quote(name)} = :key_{j}" for j, name in enumerate(key_names[:i])]
+        conditions.append("(" + " AND ".join(equal + [f"{quote(key_names[i])} > :key_{i}"]) + ")")
+    return "(" + " OR ".join(conditions) + ")"
+
+
+def _load_progress(connection, table_name):
+    row = connection.execute(text("SELECT last_key FROM ciphertext_conversion WHERE table_name = :table_name"), {"table_name": table_name}).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def _save_progress(connection, table_name, last_key):
+    parameters = {"table_name": table_name, "last_key": json.dumps(last_key)}
+    if connection.execute(text("UPDATE ciphertext_conversion SET last_key = :last_key WHERE table_name = :table_name"), parameters).rowcount == 0:
+        connection.execute(text("INSERT INTO ciphertext_conversion (table_name, last_key) VALUES (:table_name, :last_key)"), parameters)
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        convert(restart='--restart' in sys.argv)
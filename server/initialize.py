@@ -11,7 +11,7 @@ import os
 from sqlalchemy import create_engine
 from sqlalchemy.exc import OperationalError
 import base64
-from app.crypto import aes_encrypt
+from app.crypto import AESKey
 import re
 
 
@@ -25,7 +25,7 @@ def _setup_cli():
     secret_key = base64.b64encode(os.urandom(32)).decode("utf-8")
 
     print("Retrieving sql data")
-    mysql_uri = _get_sql_data()
+    database_uri = _get_sql_data()
 
     print("Creating database key")
     database_key = base64.b64encode(os.urandom(32)).decode("utf-8")
@@ -46,8 +46,8 @@ def _setup_cli():
     # Encrypt the sensitive data and save to env.json.enc
     print("\n"*3)
     print("Encrypting data")
-    env_json = str({"secret_key": secret_key, "mysql_uri": mysql_uri, "database_key": database_key})
-    env_json_enc = aes_encrypt(env_json, encryption_key)
+    env_json = str({"secret_key": secret_key, "database_uri": database_uri, "database_key": database_key})
+    env_json_enc = AESKey(encryption_key).encrypt(env_json)
 
     with open(os.path.abspath(__file__) + '/../app/secrets/env.json.enc', 'w') as file:
         file.write(env_json_enc)
@@ -57,21 +57,20 @@ def _setup_cli():
 
 def _get_sql_data():
     """
-    Retrieves the user's mysql data from the command line interface and tests the connection.
-    :return: the mysql uri
+    Retrieves the user's database data from the command line interface and tests the connection.
+    :return: the database uri
     """
-    username = _sanitize_user_input(input("Please enter your mysql username: "))
-    password = _sanitize_user_input(input("Please enter your mysql password: "))
-    host = _sanitize_user_input(input("Please enter the host of your mysql server: "))
-    port = _sanitize_user_input(input("Please enter the port of your mysql server: "))
-    database = _sanitize_user_input(input("Please enter the database name: "))
+    database_type = input("Please enter the database type, mysql or sqlite (default mysql): ").strip().lower()
 
-    uri = f"mysql://{username}:{password}@{host}:{port}/{database}"
+    if database_type == "sqlite":
+        uri = _get_sqlite_data()
+    else:
+        uri = _get_mysql_data()
 
     try:
         engine = create_engine(uri)
         connection = engine.connect()
-        print("MySQL Connection successful!")
+        print("Database Connection successful!")
         connection.close()
 
     except OperationalError as e:
@@ -82,6 +81,31 @@ def _get_sql_data():
     return uri
 
 
+def _get_sqlite_data():
+    """
+    Retrieves the location of the SQLite database file from the command line interface.
+    :return: the sqlite uri
+    """
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.sqlite')
+    path = input(f"Please enter the path of the database file (default {default_path}): ").strip()
+
+    return "sqlite:///" + os.path.abspath(path or default_path)
+
+
+def _get_mysql_data():
+    """
+    Retrieves the user's mysql data from the command line interface.
+    :return: the mysql uri
+    """
+    username = _sanitize_user_input(input("Please enter your mysql username: "))
+    password = _sanitize_user_input(input("Please enter your mysql password: "))
+    host = _sanitize_user_input(input("Please enter the host of your mysql server: "))
+    port = _sanitize_user_input(input("Please enter the port of your mysql server: "))
+    database = _sanitize_user_input(input("Please enter the database name: "))
+
+    return f"mysql://{username}:{password}@{host}:{port}/{database}"
+
+
 def _sanitize_user_input(user_input):
     """
     Sanitizes user input, and alerts console if sanitization was necessary.
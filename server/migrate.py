@@ -0,0 +1,165 @@
+"""
+File used to bring the tables of an existing database up to date with the models. Creates missing tables,
+rebuilds tables whose primary key changed or that SQLite created without AUTOINCREMENT, adds missing columns
+and builds missing indexes. On MySQL, indexes are built online without locking the tables. Safe to run
+multiple times. Afterwards, finishes the deletes of pages that were interrupted.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+from app import db, create_app
+import app.models
+from app.page_routes import delete_orphan_pages
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+
+# Statements run before building a unique index, removing the rows that would violate it
+_UNIQUE_INDEX_CLEANUPS = {
+    'ix_invite_user_id_page_id': "DELETE FROM invite WHERE id NOT IN "
+                                 "(SELECT id FROM (SELECT MIN(id) AS id FROM invite GROUP BY user_id, page_id) AS keep_invites)",
+}
+
+
+def migrate():
+    """
+    Migrates the database of the current application context.
+    :return:
+    """
+    engine = db.engine
+
+    print("Creating missing tables")
+    db.create_all()
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+
+        for table in db.metadata.sorted_tables:
+            if _needs_rebuild(inspector, table):
+                _rebuild_table(connection, inspector, table)
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+
+        for table in db.metadata.sorted_tables:
+            _add_missing_columns(connection, inspector, table)
+
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+
+        for table in db.metadata.sorted_tables:
+            _add_missing_indexes(connection, inspector, table)
+
+    print("Migration successful")
+
+
+def _needs_rebuild(inspector, table):
+    """
+    Checks if a table can only be brought up to date by rebuilding it, such as when its primary key changed.
+    :param inspector: inspector for the database
+    :param table: the model's table
+    :return: true if the table must be rebuilt, false otherwise
+    """
+    existing_primary_key = inspector.get_pk_constraint(table.name)['constrained_columns']
+    if set(existing_primary_key) != {column.name for column in table.primary_key.columns}:
+        return True
+
+    # SQLite can only add AUTOINCREMENT to a table by creating it again
+    if inspector.bind.dialect.name == 'sqlite' and table.dialect_options['sqlite']['autoincrement']:
+        sql = inspector.bind.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}).scalar()
+        return "AUTOINCREMENT" not in sql.upper()
+
+    return False
+
+
+def _rebuild_table(connection, inspector, table):
+    """
+    Recreates a table from its model and copies the rows of the columns it kept. The table's indexes are
+    built again afterwards by _add_missing_indexes.
+    :param connection: database connection
+    :param inspector: inspector for the database
+    :param table: the model's table
+    :return:
+    """
+    print(f"Rebuilding table {table.name}")
+    quote = connection.dialect.identifier_preparer.quote
+    existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+    columns = ", ".join(quote(column.name) for column in table.columns if column.name in existing_columns)
+
+    # Created under a temporary name, then swapped in, so other tables' foreign keys keep pointing at the table
+    new_table = table.to_metadata(db.metadata, name=table.name + "_rebuilt")
+    try:
+        connection.execute(CreateTable(new_table))
+    finally:
+        db.metadata.remove(new_table)
+
+    connection.execute(text(f"INSERT INTO {quote(new_table.name)} ({columns}) SELECT {columns} FROM {quote(table.name)}"))
+    connection.execute(text(f"DROP TABLE {quote(table.name)}"))
+    connection.execute(text(f"ALTER TABLE {quote(new_table.name)} RENAME TO {quote(table.name)}"))
+
+
+def _add_missing_columns(connection, inspector, table):
+    """
+    Adds the columns of a model that do not exist in the database table.
+    :param connection: database connection
+    :param inspector: inspector for the database
+    :param table: the model's table
+    :return:
+    """
+    existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+
+    for column in table.columns:
+        if column.name in existing_columns:
+            continue
+
+        print(f"Adding column {table.name}.{column.name}")
+        quote = connection.dialect.identifier_preparer.quote
+        column_type = column.type.compile(dialect=connection.dialect)
+        statement = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+
+        # Existing rows are filled with the column's default value
+        if column.default is not None and column.default.is_scalar:
+            statement += f" DEFAULT {column.default.arg!r}"
+        if not column.nullable:
+            statement += " NOT NULL"
+
+        connection.execute(text(statement))
+
+
+def _add_missing_indexes(connection, inspector, table):
+    """
+    Builds the indexes of a model that do not exist in the database table.
+    :param connection: database connection
+    :param inspector: inspector for the database
+    :param table: the model's table
+    :return:
+    """
+    existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+
+    for index in table.indexes:
+        if index.name in existing_indexes:
+            continue
+
+        print(f"Building index {index.name} on {table.name}")
+
+        if index.unique and index.name in _UNIQUE_INDEX_CLEANUPS:
+            connection.execute(text(_UNIQUE_INDEX_CLEANUPS[index.name]))
+
+        if connection.dialect.name == 'mysql':
+            # Build the index in place while allowing reads and writes
+            quote = connection.dialect.identifier_preparer.quote
+            columns = ", ".join(quote(column.name) for column in index.columns)
+            unique = "UNIQUE " if index.unique else ""
+            connection.execute(text(f"ALTER TABLE {quote(table.name)} ADD {unique}INDEX {quote(index.name)} ({columns}), ALGORITHM=INPLACE, LOCK=NONE"))
+        else:
+            connection.execute(CreateIndex(index))
+
+        connection.commit()
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        migrate()
+        print(f"Deleted {delete_orphan_pages()} pages without users")
@@ -0,0 +1,8 @@
+"""
+Tests of the server. Run from the server directory:
+
+    python -m unittest discover tests
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
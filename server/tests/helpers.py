@@ -0,0 +1,118 @@
+"""
+Helpers of the tests that run the application. The server's configuration is decrypted with a key typed at
+startup, so these tests configure the application with a throwaway encrypted configuration, key and SQLite
+database in a temporary directory instead.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from app.crypto import AESKey, aes_key_to_string, generate_aes_key
+
+_state = {}
+
+
+def get_app():
+    """
+    Returns the application of the tests, creating it on the first call. The configuration module is loaded
+    once per process, so every test shares the application and empties its database instead.
+    :return: the application
+    """
+    if 'app' not in _state:
+        directory = tempfile.mkdtemp(prefix='server-tests-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+
+        config_data = {
+            "secret_key": aes_key_to_string(generate_aes_key()),
+            "database_uri": "sqlite:///" + os.path.join(directory, 'database.sqlite'),
+            "database_key": aes_key_to_string(generate_aes_key()),
+            "session_sqlite_path": os.path.join(directory, 'sessions.sqlite'),
+            "profiler_dir": os.path.join(directory, 'profiles'),
+            "query_budget_enabled": True,
+            "query_budget_raise": True,
+        }
+        encryption_key = aes_key_to_string(generate_aes_key())
+        env_file = os.path.join(directory, 'env.json.enc')
+        with open(env_file, 'w') as file:
+            file.write(AESKey(encryption_key).encrypt(json.dumps(config_data)))
+
+        os.environ['ENV_FILE'] = env_file
+        with mock.patch('getpass.getpass', return_value=encryption_key):
+            from app import create_app
+            _state['app'] = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+
+    return _state['app']
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    Test case with an empty database, and helpers creating users, pages and logged-in clients. No application
+    context is kept pushed, since requests would share it and the values they keep in g.
+    """
+
+    def setUp(self):
+        from app import db
+        from app.cache import named_caches
+
+        self.app = get_app()
+        self.db = db
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+        for cache in named_caches().values():
+            cache.clear()
+
+    def create_user(self, username):
+        """
+        Creates a user.
+        :param username: the user's username
+        :return: the id of the user
+        """
+        from app.models import User
+
+        user = User(username=username, encrypted_email='email-' + username, email_hash='hash-' + username, public_key='public-key-' + username,
+                    encrypted_private_key='private-key', aes_salt='s' * 16, browser_encryption_key='browser-key-' + username)
+        user.set_password('password')
+        with self.app.app_context():
+            self.db.session.add(user)
+            self.db.session.commit()
+            return user.id
+
+    def create_page(self, *user_ids):
+        """
+        Creates a page the given users have access to.
+        :param user_ids: the ids of the users
+        :return: the id of the page
+        """
+        from app.models import Page, UserAccess
+
+        with self.app.app_context():
+            page = Page(encrypted_title='title', encrypted_description='description')
+            self.db.session.add(page)
+            self.db.session.flush()
+            for user_id in user_ids:
+                self.db.session.add(UserAccess(page_id=page.id, user_id=user_id, encrypted_key='page-key-%d' % user_id))
+            self.db.session.commit()
+            return page.id
+
+    def client_for(self, user_id):
+        """
+        Creates a test client logged in as a user.
+        :param user_id: the id of the user
+        :return: the client
+        """
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+            session['last_login_time'] = time.time()
+        return client
@@ -0,0 +1,94 @@
+"""
+Tests of the page changes since a version, and of the tombstones of deleted posts.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import unittest
+from tests.helpers import AppTestCase
+
+
+class PageChangesTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user_id = self.create_user('alice')
+        self.page_id = self.create_page(user_id)
+        self.client = self.client_for(user_id)
+
+    def add_post(self, message):
+        data = self.client.post('/page/%d/add-post' % self.page_id, data={'encrypted_message': message}).json
+        return data['new_posts'][0]['id'], data['version']
+
+    def delete_post(self, post_id):
+        return self.client.post('/page/%d/delete-post/%d' % (self.page_id, post_id), data={'post_id': post_id}).json
+
+    def get_changes(self, since):
+        return self.client.get('/page/%d/changes?since=%d' % (self.page_id, since)).json
+
+    def tombstone_count(self):
+        from app.models import DeletedPost
+
+        with self.app.app_context():
+            return DeletedPost.query.filter_by(page_id=self.page_id).count()
+
+    def test_returns_the_posts_added_and_deleted_since_a_version(self):
+        first_id, _ = self.add_post("first")
+        _, version = self.add_post("second")
+        third_id, _ = self.add_post("third")
+        self.delete_post(first_id)
+
+        changes = self.get_changes(version)
+
+        self.assertFalse(changes.get('reset', False))
+        self.assertEqual([post['id'] for post in changes['new_posts']], [third_id])
+        self.assertEqual(changes['deleted_posts'], [first_id])
+        self.assertEqual(changes['version'], version + 2)
+
+    def test_up_to_date_client_gets_no_changes(self):
+        _, version = self.add_post("first")
+
+        changes = self.get_changes(version)
+
+        self.assertEqual((changes['new_posts'], changes['deleted_posts'], changes['version']), ([], [], version))
+
+    def test_versions_outside_the_page_history_reset(self):
+        _, version = self.add_post("first")
+
+        self.assertTrue(self.get_changes(version + 1)['reset'])
+        self.assertTrue(self.get_changes(-1)['reset'])
+        self.assertTrue(self.client.get('/page/%d/changes' % self.page_id).json['reset'])
+
+    def test_too_many_changes_reset(self):
+        self.app.config['MAX_PAGE_SIZE'], max_page_size = 2, self.app.config['MAX_PAGE_SIZE']
+        self.addCleanup(self.app.config.__setitem__, 'MAX_PAGE_SIZE', max_page_size)
+        for i in range(3):
+            self.add_post("message %d" % i)
+
+        self.assertTrue(self.get_changes(0)['reset'])
+
+    def test_tombstones_past_the_retention_are_swept(self):
+        self.app.config['TOMBSTONE_RETENTION'], retention = 3, self.app.config['TOMBSTONE_RETENTION']
+        self.addCleanup(self.app.config.__setitem__, 'TOMBSTONE_RETENTION', retention)
+
+        post_ids = [self.add_post("message %d" % i)[0] for i in range(6)]
+        for post_id in post_ids:
+            self.delete_post(post_id)
+
+        # Deleting the last post bumped the page to version 12, tombstones at or below version 9 are swept
+        self.assertEqual(self.tombstone_count(), 3)
+        self.assertTrue(self.get_changes(8)['reset'])
+        self.assertEqual(self.get_changes(9)['deleted_posts'], post_ids[3:])
+
+    def test_deleted_post_ids_are_not_reused(self):
+        post_id, _ = self.add_post("first")
+        self.delete_post(post_id)
+        new_post_id, _ = self.add_post("second")
+
+        self.assertGreater(new_post_id, post_id)
+        self.assertEqual(self.tombstone_count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
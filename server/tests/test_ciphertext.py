@@ -0,0 +1,60 @@
+"""
+Tests of the binary envelope of ciphertext columns.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import base64
+import os
+import unittest
+from app.ciphertext import pack, unpack, is_packed
+
+
+def _base64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+class EnvelopeTest(unittest.TestCase):
+
+    def assertRoundTrip(self, text, version):
+        packed = pack(text)
+
+        self.assertTrue(is_packed(packed))
+        self.assertEqual(packed[0], version)
+        self.assertEqual(unpack(packed), text)
+
+    def test_hex_pair(self):
+        self.assertRoundTrip(os.urandom(16).hex() + ":" + os.urandom(40).hex(), 1)
+
+    def test_base64_pair(self):
+        self.assertRoundTrip(_base64(os.urandom(16)) + ":" + _base64(os.urandom(41)), 2)
+
+    def test_single_base64(self):
+        self.assertRoundTrip(_base64(os.urandom(300)), 3)
+
+    def test_long_iv_hex_pair_is_kept_verbatim(self):
+        self.assertRoundTrip(os.urandom(300).hex() + ":" + os.urandom(16).hex(), 0)
+
+    def test_long_iv_base64_pair_is_kept_verbatim(self):
+        self.assertRoundTrip(_base64(os.urandom(300)) + ":" + _base64(os.urandom(16)), 0)
+
+    def test_non_canonical_text_is_kept_verbatim(self):
+        for text in ("plain text", "ABCDEF:0123", "abc:", ":", "YWJj:bad base64", "not base64!", "héllo"):
+            with self.subTest(text=text):
+                packed = pack(text)
+                self.assertEqual(unpack(packed), text)
+
+    def test_empty_text(self):
+        self.assertRoundTrip("", 0)
+
+    def test_values_stored_as_text_are_read_unchanged(self):
+        text = os.urandom(16).hex() + ":" + os.urandom(16).hex()
+
+        self.assertFalse(is_packed(text.encode('utf-8')))
+        self.assertEqual(unpack(text.encode('utf-8')), text)
+        self.assertEqual(unpack(text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
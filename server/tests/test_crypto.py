@@ -0,0 +1,66 @@
+"""
+Tests of the batched AES functions against the single message ones.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import os
+import unittest
+from app.crypto import AESKey, aes_decrypt, aes_decrypt_many, aes_encrypt, aes_key_to_string, generate_aes_key
+
+# Around the block size and around the size above which messages are decrypted on their own
+_SIZES = (0, 1, 15, 16, 17, 26, 255, 1023, 1024, 1025, 4096)
+
+
+class BatchDecryptTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key_string = aes_key_to_string(generate_aes_key())
+        self.key = AESKey(self.key_string)
+
+    def test_matches_single_decrypts(self):
+        messages = [os.urandom(size).hex()[:size] for size in _SIZES]
+        encrypted = [self.key.encrypt(message) for message in messages]
+
+        self.assertEqual(self.key.decrypt_many(encrypted), messages)
+        self.assertEqual(self.key.decrypt_many(encrypted), [self.key.decrypt(message) for message in encrypted])
+
+    def test_returns_bytes(self):
+        messages = [os.urandom(size) for size in _SIZES]
+        encrypted = [self.key.encrypt(message) for message in messages]
+
+        self.assertEqual(self.key.decrypt_many(encrypted, as_bytes=True), messages)
+
+    def test_raw_buffers(self):
+        messages = [os.urandom(size) for size in _SIZES]
+        buffers = [self.key.encrypt_bytes(message) for message in messages]
+
+        self.assertEqual(self.key.decrypt_bytes_many(buffers), messages)
+        self.assertEqual(self.key.decrypt_bytes_many([bytearray(buffer) for buffer in buffers]), messages)
+
+    def test_unicode_messages(self):
+        messages = ["héllo wörld", "日本語のテキスト" * 50, "🙂"]
+
+        self.assertEqual(self.key.decrypt_many(self.key.encrypt_many(messages)), messages)
+
+    def test_empty_batch(self):
+        self.assertEqual(self.key.decrypt_many([]), [])
+        self.assertEqual(self.key.decrypt_bytes_many([]), [])
+
+    def test_module_functions_agree(self):
+        messages = ["2026-10-18 10:33:42.123456", "x" * 2000]
+        encrypted = [aes_encrypt(message, self.key_string) for message in messages]
+
+        self.assertEqual(aes_decrypt_many(encrypted, self.key_string), messages)
+        self.assertEqual([aes_decrypt(message, self.key_string) for message in encrypted], messages)
+
+    def test_other_key_does_not_decrypt(self):
+        encrypted = [self.key.encrypt("secret message")]
+        other_key = AESKey(aes_key_to_string(generate_aes_key()))
+
+        self.assertNotEqual(other_key.decrypt_many(encrypted, as_bytes=True), [b"secret message"])
+
+
+if __name__ == '__main__':
+    unittest.main()
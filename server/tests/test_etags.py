@@ -0,0 +1,94 @@
+"""
+Tests of the ETags and 304 Not Modified responses of the init-get endpoints.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import unittest
+from tests.helpers import AppTestCase
+
+
+class ETagTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice_id = self.create_user('alice')
+        self.bob_id = self.create_user('bob')
+        self.page_id = self.create_page(self.alice_id, self.bob_id)
+        self.alice = self.client_for(self.alice_id)
+        self.bob = self.client_for(self.bob_id)
+
+    def revalidate(self, client, url, etag):
+        return client.get(url, headers={'If-None-Match': etag})
+
+    def test_unchanged_page_is_not_sent_again(self):
+        url = '/page/%d/init-get' % self.page_id
+        response = self.alice.get(url)
+        etag = response.headers['ETag']
+
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        revalidated = self.revalidate(self.alice, url, etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.data, b"")
+        self.assertEqual(revalidated.headers['ETag'], etag)
+
+    def test_new_and_deleted_posts_change_the_page_etag(self):
+        url = '/page/%d/init-get' % self.page_id
+        etag = self.alice.get(url).headers['ETag']
+
+        post_id = self.bob.post('/page/%d/add-post' % self.page_id, data={'encrypted_message': 'hello'}).json['new_posts'][0]['id']
+        response = self.revalidate(self.alice, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['message'] for post in response.json['posts']], ['hello'])
+
+        etag = response.headers['ETag']
+        self.bob.post('/page/%d/delete-post/%d' % (self.page_id, post_id), data={'post_id': post_id})
+        self.assertEqual(self.revalidate(self.alice, url, etag).status_code, 200)
+
+    def test_page_etag_depends_on_the_user_and_the_query(self):
+        url = '/page/%d/init-get' % self.page_id
+        etag = self.alice.get(url).headers['ETag']
+
+        self.assertEqual(self.revalidate(self.bob, url, etag).status_code, 200)
+        self.assertEqual(self.revalidate(self.alice, url + '?limit=1', etag).status_code, 200)
+
+    def test_compressed_page_keeps_its_etag_weakly(self):
+        url = '/page/%d/init-get' % self.page_id
+        for i in range(20):
+            self.alice.post('/page/%d/add-post' % self.page_id, data={'encrypted_message': 'message %d' % i})
+
+        etag = self.alice.get(url).headers['ETag']
+        response = self.alice.get(url, headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['ETag'], 'W/' + etag)
+        self.assertEqual(self.revalidate(self.alice, url, response.headers['ETag']).status_code, 304)
+
+    def test_dashboard_etag_changes_with_the_users_pages(self):
+        url = '/pages/init-get'
+        etag = self.bob.get(url).headers['ETag']
+        self.assertEqual(self.revalidate(self.bob, url, etag).status_code, 304)
+
+        self.alice.post('/pages/%d/delete' % self.page_id, data={'page_id': self.page_id})
+        self.assertEqual(self.revalidate(self.bob, url, etag).status_code, 304)
+
+        self.bob.post('/pages/%d/delete' % self.page_id, data={'page_id': self.page_id})
+        response = self.revalidate(self.bob, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['pages'], [])
+
+    def test_invites_etag_changes_with_the_users_invites(self):
+        carol = self.client_for(self.create_user('carol'))
+        url = '/pages/invites/init-get'
+        etag = carol.get(url).headers['ETag']
+        self.assertEqual(self.revalidate(carol, url, etag).status_code, 304)
+
+        self.alice.post('/page/%d/invite-users' % self.page_id, data={'encrypted_keys-0-username': 'carol', 'encrypted_keys-0-key': 'key'})
+        response = self.revalidate(carol, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['invites']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
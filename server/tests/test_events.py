@@ -0,0 +1,172 @@
+"""
+Tests of the live page event brokers.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import multiprocessing
+import os
+import tempfile
+import unittest
+from flask import Flask, Response
+from app.events import EventStream, LocalBroker, SQLiteBroker
+
+
+def _publish_events(path, page_id, events):
+    # Runs in another process, with its own broker on the same file like another worker would
+    broker = SQLiteBroker(path, poll_interval=0.01)
+    for event in events:
+        broker.publish(page_id, event)
+
+
+class LocalBrokerTest(unittest.TestCase):
+
+    def test_delivers_events_of_the_subscribed_page(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe(1)
+        self.addCleanup(subscription.close)
+
+        broker.publish(2, {"type": "other"})
+        broker.publish(1, {"type": "posts", "version": 1})
+
+        self.assertEqual(subscription.get(timeout=0.1), {"type": "posts", "version": 1})
+        self.assertIsNone(subscription.get(timeout=0.01))
+
+    def test_full_queue_is_replaced_by_a_resync(self):
+        broker = LocalBroker(queue_size=2)
+        subscription = broker.subscribe(1)
+        self.addCleanup(subscription.close)
+
+        for version in range(1, 4):
+            broker.publish(1, {"type": "posts", "version": version})
+
+        # The missed events are dropped, since the client reloads the page state on a resync
+        self.assertEqual(subscription.get(timeout=0.1), {"type": "resync"})
+        self.assertIsNone(subscription.get(timeout=0.01))
+
+        broker.publish(1, {"type": "posts", "version": 4})
+        self.assertEqual(subscription.get(timeout=0.1), {"type": "posts", "version": 4})
+
+    def test_closed_subscription_receives_nothing(self):
+        broker = LocalBroker()
+        closed = broker.subscribe(1)
+        other = broker.subscribe(1)
+        self.addCleanup(other.close)
+
+        closed.close()
+        broker.publish(1, {"type": "posts", "version": 1})
+
+        self.assertIsNone(closed.get(timeout=0.01))
+        self.assertEqual(other.get(timeout=0.1), {"type": "posts", "version": 1})
+
+    def test_closing_twice_is_harmless(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe(1)
+
+        subscription.close()
+        subscription.close()
+        broker.publish(1, {"type": "posts", "version": 1})
+
+
+class SQLiteBrokerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'events.sqlite')
+        self.broker = SQLiteBroker(self.path, poll_interval=0.01)
+
+    def subscribe(self, page_id):
+        subscription = self.broker.subscribe(page_id)
+        self.addCleanup(subscription.close)
+        return subscription
+
+    def test_delivers_events_published_by_another_process(self):
+        subscription = self.subscribe(1)
+        events = [{"type": "posts", "version": version} for version in range(1, 4)]
+
+        process = multiprocessing.get_context('spawn').Process(target=_publish_events, args=(self.path, 1, events))
+        process.start()
+        process.join(timeout=30)
+        self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual([subscription.get(timeout=1) for _ in events], events)
+        self.assertIsNone(subscription.get(timeout=0.05))
+
+    def test_only_delivers_events_published_after_subscribing(self):
+        self.broker.publish(1, {"type": "posts", "version": 1})
+        subscription = self.subscribe(1)
+        self.broker.publish(2, {"type": "posts", "version": 1})
+        self.broker.publish(1, {"type": "posts", "version": 2})
+
+        self.assertEqual(subscription.get(timeout=1), {"type": "posts", "version": 2})
+        self.assertIsNone(subscription.get(timeout=0.05))
+
+    def test_reads_backlogs_larger_than_a_poll(self):
+        subscription = self.subscribe(1)
+        for version in range(250):
+            self.broker.publish(1, {"type": "posts", "version": version})
+
+        self.assertEqual([subscription.get(timeout=1)["version"] for _ in range(250)], list(range(250)))
+
+    def test_subscriptions_are_independent(self):
+        first = self.subscribe(1)
+        second = self.broker.subscribe(1)
+        self.broker.publish(1, {"type": "posts", "version": 1})
+
+        self.assertEqual(second.get(timeout=1), {"type": "posts", "version": 1})
+        second.close()
+        self.broker.publish(1, {"type": "posts", "version": 2})
+
+        self.assertEqual(first.get(timeout=1), {"type": "posts", "version": 1})
+        self.assertEqual(first.get(timeout=1), {"type": "posts", "version": 2})
+
+
+class EventStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.event_stream = EventStream(self.app)
+
+        @self.app.route('/events')
+        def events():
+            return Response(self.event_stream.stream(1, keepalive=0.01, timeout=0.05), mimetype='text/event-stream')
+
+    def subscription_count(self):
+        return len(self.event_stream.broker._subscriptions.get(1, ()))
+
+    def test_unstarted_stream_does_not_subscribe(self):
+        stream = self.event_stream.stream(1, keepalive=0.01, timeout=0.05)
+
+        self.assertEqual(self.subscription_count(), 0)
+        stream.close()
+        self.assertEqual(self.subscription_count(), 0)
+
+    def test_head_requests_leave_no_subscriptions(self):
+        client = self.app.test_client()
+        for _ in range(5):
+            self.assertEqual(client.head('/events').status_code, 200)
+
+        self.assertEqual(self.subscription_count(), 0)
+
+    def test_stream_unsubscribes_when_closed(self):
+        stream = self.event_stream.stream(1, keepalive=1, timeout=10)
+
+        self.assertEqual(next(stream), "retry: 3000\n\n")
+        self.event_stream.publish(1, {"type": "posts", "version": 7})
+        self.assertEqual(next(stream), "id: 7\n")
+        self.assertEqual(self.subscription_count(), 1)
+
+        stream.close()
+        self.assertEqual(self.subscription_count(), 0)
+
+    def test_stream_unsubscribes_when_it_times_out(self):
+        response = self.app.test_client().get('/events')
+
+        self.assertTrue(response.get_data(as_text=True).startswith("retry: 3000\n\n: keepalive\n\n"))
+        self.assertEqual(self.subscription_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Tests of the keyset pagination of page posts.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import unittest
+from tests.helpers import AppTestCase
+
+
+class PostPaginationTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user_id = self.create_user('alice')
+        self.page_id = self.create_page(user_id)
+        self.client = self.client_for(user_id)
+        self.post_ids = [self.add_post("message %d" % i) for i in range(7)]
+
+    def add_post(self, message):
+        response = self.client.post('/page/%d/add-post' % self.page_id, data={'encrypted_message': message})
+        return response.json['new_posts'][0]['id']
+
+    def get_posts(self, url):
+        data = self.client.get(url).json
+        return [post['id'] for post in data['posts']], data['has_more']
+
+    def test_first_page_has_the_newest_posts_oldest_first(self):
+        self.assertEqual(self.get_posts('/page/%d/init-get?limit=3' % self.page_id), (self.post_ids[4:], True))
+
+    def test_before_cursor_walks_back_to_the_oldest_post(self):
+        url = '/page/%d/posts?limit=3&before=%d'
+
+        self.assertEqual(self.get_posts(url % (self.page_id, self.post_ids[4])), (self.post_ids[1:4], True))
+        self.assertEqual(self.get_posts(url % (self.page_id, self.post_ids[1])), (self.post_ids[:1], False))
+
+    def test_after_cursor_walks_forward_to_the_newest_post(self):
+        url = '/page/%d/posts?limit=3&after=%d'
+
+        self.assertEqual(self.get_posts(url % (self.page_id, self.post_ids[0])), (self.post_ids[1:4], True))
+        self.assertEqual(self.get_posts(url % (self.page_id, self.post_ids[3])), (self.post_ids[4:], False))
+
+    def test_pages_are_not_shifted_by_new_posts(self):
+        first_page, _ = self.get_posts('/page/%d/init-get?limit=3' % self.page_id)
+        self.add_post("newer message")
+
+        older, _ = self.get_posts('/page/%d/posts?limit=3&before=%d' % (self.page_id, first_page[0]))
+        self.assertEqual(older, self.post_ids[1:4])
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(self.get_posts('/page/%d/posts?limit=0' % self.page_id), (self.post_ids[-1:], True))
+
+        self.app.config['MAX_PAGE_SIZE'], max_page_size = 5, self.app.config['MAX_PAGE_SIZE']
+        self.addCleanup(self.app.config.__setitem__, 'MAX_PAGE_SIZE', max_page_size)
+        self.assertEqual(self.get_posts('/page/%d/posts?limit=100' % self.page_id), (self.post_ids[2:], True))
+
+    def test_posts_keep_their_content(self):
+        posts = self.client.get('/page/%d/init-get' % self.page_id).json['posts']
+
+        self.assertEqual([post['message'] for post in posts], ["message %d" % i for i in range(7)])
+        self.assertEqual({post['user'] for post in posts}, {'alice'})
+
+    def test_members_only(self):
+        outsider = self.client_for(self.create_user('mallory'))
+
+        self.assertEqual(outsider.get('/page/%d/posts?before=%d' % (self.page_id, self.post_ids[-1])).status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Tests of the routing of reads to database replicas, with a primary and a replica in two SQLite files.
+
+@author Ethan Andrews
+@version 2026.10.18
+"""
+
+import os
+import tempfile
+import unittest
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from app.replicas import ReplicaRouter, RoutingSession, STICKY_COOKIE
+
+
+def _create_app(directory, replicas=True):
+    """
+    Creates an application with a note table in a primary and a replica database, holding different rows so
+    the responses show which database was read.
+    :param directory: the directory of the database files
+    :param replicas: false to configure no replicas
+    :return: the application
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'primary.sqlite')
+    app.config['SQLALCHEMY_BINDS'] = {'replica_0': 'sqlite:///' + os.path.join(directory, 'replica.sqlite')}
+    app.config['DATABASE_REPLICAS'] = ['replica_0'] if replicas else []
+
+    db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String(20), nullable=False)
+
+    db.init_app(app)
+    ReplicaRouter(app)
+
+    with app.app_context():
+        for bind_key, text in ((None, 'primary'), ('replica_0', 'replica')):
+            db.metadata.create_all(db.engines[bind_key])
+            with db.engines[bind_key].begin() as connection:
+                connection.execute(Note.__table__.insert(), {"text": text})
+
+    def read_notes():
+        return sorted(note.text for note in Note.query)
+
+    @app.route('/notes', methods=['GET'])
+    def get_notes():
+        return jsonify(read_notes())
+
+    @app.route('/notes', methods=['POST'])
+    def add_note():
+        db.session.add(Note(text='added'))
+        db.session.commit()
+        return jsonify(read_notes())
+
+    @app.route('/notes/add-and-read', methods=['GET'])
+    def add_note_and_read():
+        db.session.add(Note(text='added'))
+        db.session.commit()
+        return jsonify(read_notes())
+
+    return app
+
+
+class ReplicaRoutingTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.client = _create_app(self.directory).test_client()
+
+    def test_get_reads_from_the_replica(self):
+        response = self.client.get('/notes')
+
+        self.assertEqual(response.json, ['replica'])
+        self.assertNotIn(STICKY_COOKIE, response.headers.get('Set-Cookie', ''))
+
+    def test_post_writes_and_reads_the_primary(self):
+        response = self.client.post('/notes')
+
+        self.assertEqual(response.json, ['added', 'primary'])
+        self.assertIn(STICKY_COOKIE, response.headers['Set-Cookie'])
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        self.client.post('/notes')
+
+        # The client sends the sticky cookie, so it sees its own write even though the replica has not
+        self.assertEqual(self.client.get('/notes').json, ['added', 'primary'])
+
+    def test_get_that_writes_reads_its_write(self):
+        self.assertEqual(self.client.get('/notes/add-and-read').json, ['added', 'primary'])
+
+    def test_sticky_cookie_expires(self):
+        response = self.client.post('/notes')
+
+        self.assertIn('Max-Age=10', response.headers['Set-Cookie'])
+        self.client.delete_cookie(STICKY_COOKIE)
+        self.assertEqual(self.client.get('/notes').json, ['replica'])
+
+    def test_without_replicas_reads_from_the_primary(self):
+        client = _create_app(tempfile.mkdtemp(dir=self.directory), replicas=False).test_client()
+
+        self.assertEqual(client.get('/notes').json, ['primary'])
+
+
+if __name__ == '__main__':
+    unittest.main()